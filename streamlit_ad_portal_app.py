@@ -19,26 +19,59 @@ How to run:
    streamlit run streamlit_ad_portal_app.py
 
 Notes:
-- The app will create `employees.xlsx` in the working directory if it doesn't exist.
-- Excel writes are atomic: it writes to a temp file then replaces the original.
+- Data lives in Parquet files (`employees.parquet`, `departments.parquet`, `users.parquet`).
+- `employees.xlsx` is the Excel copy: it is imported when newer than the Parquet files
+  (or on "Reload from Excel"). Edits are copied to it on the first page interaction at
+  least EXCEL_SYNC_DELAY seconds after the last edit, on "Save to Excel", and when the
+  server shuts down. There is no timer, so an idle session's copy waits for one of those.
+- The app will create `employees.xlsx` in the working directory if neither exists.
+- Writes are atomic: each file is written to a temp file then replaces the original.
 - This is intended as a lightweight admin tool — not a replacement for a secure AD.
 """
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
 import tempfile
-import shutil
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import partial
 from io import BytesIO
 import time
+import atexit
+import importlib.util
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+from openpyxl import Workbook
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+try:
+    # Optional Rust-backed xlsx writer; falls back to openpyxl when not installed
+    from rustpy_xlsxwriter import FastExcel
+except ImportError:
+    FastExcel = None
+
+# Optional Rust-backed xlsx reader for pandas; parses workbooks far faster than openpyxl.
+# pandas imports it itself, so only check that it is installed
+EXCEL_READ_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else "openpyxl"
 
 # --------------------------- Configuration ---------------------------
-EXCEL_PATH = "employees.xlsx"
+EXCEL_PATH = "employees.xlsx"  # Excel copy for import/export and manual edits
+EXCEL_SYNC_DELAY = 5  # seconds without edits before the Excel copy is refreshed
 EMP_SHEET = "Employees"
 DEPT_SHEET = "Departments"
 USERS_SHEET = "Users"  # New sheet for login credentials
 
+# Primary data store: one Parquet file per sheet
+STORE_PATHS = {
+    EMP_SHEET: "employees.parquet",
+    DEPT_SHEET: "departments.parquet",
+    USERS_SHEET: "users.parquet",
+}
+
 # Default columns for employees sheet
 EMP_COLUMNS = [
     "Row ID",      # Auto-generated internal ID
@@ -53,27 +86,42 @@ EMP_COLUMNS = [
     "Last Updated"
 ]
 
+# Employee columns held as strings (everything except the numeric Row ID)
+EMP_TEXT_COLUMNS = [c for c in EMP_COLUMNS if c != "Row ID"]
+
+# Arrow-backed strings (pyarrow ships with streamlit and backs the Parquet store)
+STRING_DTYPE = pd.StringDtype("pyarrow")
+
 DEPT_COLUMNS = ["Dept ID", "Department Name", "Description"]
 USERS_COLUMNS = ["Username", "Password", "Role", "Full Name", "Created Date"]  # Roles: admin, viewer
 
+# Manage Departments choices per department, and the choice a pending action of each kind restores
+MANAGE_DEPT_ACTIONS = ("No Change", "Rename Department", "Merge with Another Department", "Delete Department")
+MANAGE_ACTION_INDEX = {"rename": 1, "merge_two": 2, "delete": 3}
+
+def utc_now_iso() -> str:
+    """Current UTC time as an ISO-8601 timestamp (second precision)."""
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
 # --------------------------- Authentication Functions ---------------------------
 
 def init_default_users():
     """Create default admin user if no users exist."""
+    now_iso = utc_now_iso()
     return pd.DataFrame([
         {
             "Username": "admin",
             "Password": "admin123",  # Change this in production!
             "Role": "admin",
             "Full Name": "System Administrator",
-            "Created Date": datetime.utcnow().isoformat()
+            "Created Date": now_iso
         },
         {
             "Username": "viewer",
             "Password": "viewer123",
             "Role": "viewer",
             "Full Name": "Guest Viewer",
-            "Created Date": datetime.utcnow().isoformat()
+            "Created Date": now_iso
         }
     ])
 
@@ -141,15 +189,30 @@ def ensure_workbook(path: str):
 
 
 def read_workbook(path: str):
-    """Read Employees and Departments into DataFrames."""
-    try:
-        xls = pd.read_excel(path, sheet_name=None, engine="openpyxl")
-    except FileNotFoundError:
+    """Read Employees and Departments into DataFrames (cached until the file changes)."""
+    if not os.path.exists(path):
         ensure_workbook(path)
-        xls = pd.read_excel(path, sheet_name=None, engine="openpyxl")
+    return _read_workbook_cached(path, os.path.getmtime(path))
 
-    df_emp = xls.get(EMP_SHEET, pd.DataFrame(columns=EMP_COLUMNS))
-    df_dept = xls.get(DEPT_SHEET, pd.DataFrame(columns=DEPT_COLUMNS))
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def _read_workbook_cached(path: str, mtime: float):
+    """Parse the workbook. `mtime` is only part of the cache key.
+
+    Only the latest version is worth keeping: a hand edit changes the mtime without
+    going through write_workbook's clear(), and would otherwise leave the old parse behind.
+    """
+    # dtype=str keeps IDs, extensions and phone numbers as typed instead of inferring numbers
+    xls = pd.read_excel(path, sheet_name=None, engine=EXCEL_READ_ENGINE, dtype=str)
+    return normalize_frames(xls.get(EMP_SHEET), xls.get(DEPT_SHEET), xls.get(USERS_SHEET))
+
+
+def normalize_frames(df_emp, df_dept, df_users):
+    """Bring raw sheet data to the column set and dtypes the app expects."""
+    if df_emp is None:
+        df_emp = pd.DataFrame(columns=EMP_COLUMNS)
+    if df_dept is None:
+        df_dept = pd.DataFrame(columns=DEPT_COLUMNS)
 
     # Normalize columns if missing and ensure string types
     for c in EMP_COLUMNS:
@@ -159,35 +222,33 @@ def read_workbook(path: str):
         if c not in df_dept.columns:
             df_dept[c] = ""
     
-    # Ensure department columns are string type to prevent dtype warnings
-    if not df_dept.empty:
-        df_dept["Department Name"] = df_dept["Department Name"].astype(str)
-        df_dept["Description"] = df_dept["Description"].astype(str).replace('nan', '')
+    # Text columns as strings with blanks as "" so filters stay vectorized and masks stay boolean
+    for c in EMP_TEXT_COLUMNS:
+        df_emp[c] = df_emp[c].fillna("").astype(STRING_DTYPE)
+    # Department names are matched exactly (Arrow eq kernels), so stray whitespace is trimmed once here
+    df_emp["Department"] = df_emp["Department"].str.strip()
+    # Row IDs are compared numerically (string max() would rank "9" above "10")
+    df_emp["Row ID"] = pd.to_numeric(df_emp["Row ID"], errors="coerce")
+
+    # Department columns use the same string dtype as employees (blank rather than 'nan' when empty)
+    for c in DEPT_COLUMNS:
+        df_dept[c] = df_dept[c].fillna("").astype(STRING_DTYPE)
+    # Department names are the other side of those comparisons, so they are trimmed once too
+    df_dept["Department Name"] = df_dept["Department Name"].str.strip()
     
     # Ensure all employees have Row IDs
     if not df_emp.empty:
         # Fill missing Row IDs
-        missing_ids = df_emp["Row ID"].isna() | (df_emp["Row ID"] == "") | (df_emp["Row ID"] == "nan")
-        if missing_ids.any():
-            max_id = 0
-            existing_ids = df_emp.loc[~missing_ids, "Row ID"]
-            if not existing_ids.empty:
-                try:
-                    max_id = int(existing_ids.max())
-                except:
-                    max_id = 0
-            
-            # Assign Row IDs to rows that don't have them
-            for idx in df_emp[missing_ids].index:
-                max_id += 1
-                df_emp.at[idx, "Row ID"] = max_id
-    
-    # Ensure Dept ID is consistent string type
-    if not df_dept.empty:
-        df_dept["Dept ID"] = df_dept["Dept ID"].astype(str)
+        missing_ids = df_emp["Row ID"].isna()
+        n_missing = int(missing_ids.sum())
+        if n_missing:
+            max_id = df_emp["Row ID"].max()
+            max_id = 0 if pd.isna(max_id) else int(max_id)
+            # Number the rows without IDs in sheet order, continuing after the highest existing ID
+            df_emp.loc[missing_ids, "Row ID"] = np.arange(max_id + 1, max_id + 1 + n_missing)
+        df_emp["Row ID"] = df_emp["Row ID"].astype("int64")
     
     # Read or create Users sheet
-    df_users = xls.get(USERS_SHEET, None)
     if df_users is None or df_users.empty:
         df_users = init_default_users()
     else:
@@ -196,85 +257,402 @@ def read_workbook(path: str):
             if c not in df_users.columns:
                 df_users[c] = ""
 
-    return df_emp[EMP_COLUMNS].copy(), df_dept[DEPT_COLUMNS].copy(), df_users[USERS_COLUMNS].copy()
+    return df_emp[EMP_COLUMNS], df_dept[DEPT_COLUMNS], df_users[USERS_COLUMNS]
+
+
+def file_stat(path: str):
+    """os.stat() result for path, or None if it doesn't exist (one syscall instead of exists + getmtime/getsize)."""
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def store_mtime():
+    """Oldest modification time across the Parquet store files, or None if any is missing."""
+    try:
+        return min(os.path.getmtime(p) for p in STORE_PATHS.values())
+    except FileNotFoundError:
+        return None
+
+
+def load_data():
+    """Load from the Parquet store, importing the Excel workbook if it is newer or the store is missing.
+
+    Workbooks the app writes itself move the store's mtimes up to theirs (see `write_excel_copy`),
+    so only an edit made outside the app makes the workbook newer.
+    """
+    def store_is_current():
+        excel_stat = file_stat(EXCEL_PATH)
+        return mtime is not None and (excel_stat is None or excel_stat.st_mtime <= mtime)
+
+    mtime = store_mtime()
+    if store_is_current():
+        return _read_store_cached(mtime)
+    # A background copy may be between replacing the workbook and stamping the store; once it
+    # has finished, its workbook no longer looks newer and must not be imported over the store
+    with excel_sync_registry()["lock"]:
+        mtime = store_mtime()
+        if store_is_current():
+            return _read_store_cached(mtime)
+        df_emp, df_dept, df_users = read_workbook(EXCEL_PATH)
+        write_store(df_emp, df_dept, df_users)
+    return df_emp, df_dept, df_users
+
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def _read_store_cached(mtime: float):
+    """Read the Parquet store. `mtime` is only part of the cache key."""
+    return normalize_frames(*(pd.read_parquet(STORE_PATHS[sheet]) for sheet in (EMP_SHEET, DEPT_SHEET, USERS_SHEET)))
+
+
+def write_store(df_emp: pd.DataFrame, df_dept: pd.DataFrame, df_users: pd.DataFrame):
+    """Write the three frames to the Parquet store, each file replaced atomically."""
+    df_emp_out = df_emp[EMP_COLUMNS]  # selecting a column list already returns a new frame
+    for c in EMP_TEXT_COLUMNS:
+        df_emp_out[c] = df_emp_out[c].fillna("").astype(STRING_DTYPE)
+    df_emp_out["Row ID"] = pd.to_numeric(df_emp_out["Row ID"], errors="coerce").astype("Int64")
+    frames = {
+        EMP_SHEET: df_emp_out,
+        DEPT_SHEET: df_dept[DEPT_COLUMNS].fillna("").astype(str),
+        USERS_SHEET: df_users[USERS_COLUMNS].fillna("").astype(str),
+    }
+    try:
+        for sheet, df in frames.items():
+            path = STORE_PATHS[sheet]
+            tmp_path = f"{path}.tmp"
+            df.to_parquet(tmp_path, engine="pyarrow", compression="zstd", index=False)
+            os.replace(tmp_path, path)
+    finally:
+        _read_store_cached.clear()
+
+
+def save_data(structural: bool = True):
+    """Persist the session's employees, departments and users to the primary store.
+
+    Pass `structural=False` for saves that only edit existing employee cells; adds, deletes
+    and department changes are structural and also rebuild the department lookups. Each save
+    is counted in `pending_changes` until the Excel copy catches up (see `flush_pending_writes`).
+    """
+    write_store(st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+    st.session_state._data_version += 1
+    if structural:
+        st.session_state._dept_version += 1  # structural changes may add, rename or remove departments
+    st.session_state.pending_changes += 1
+    st.session_state.last_change_time = time.time()
+    st.session_state.pop('store_stat_cache', None)
+    # Re-inserted so the registry stays in save order (see _flush_at_exit)
+    outstanding = excel_sync_registry()["frames"]
+    outstanding.pop(session_key(), None)
+    outstanding[session_key()] = (st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+
+
+@st.cache_resource
+def excel_sync_registry() -> dict:
+    """Process-wide record of each session's latest frames not yet copied to the Excel workbook.
+
+    Also owns the single background thread that writes the workbook, so writes never
+    overlap and land in the order they were queued. An atexit hook writes any frames
+    still outstanding, so stopping the server inside the sync delay doesn't leave the
+    workbook behind the Parquet store.
+    """
+    registry = {
+        "frames": {},  # session id -> that session's frames not yet copied to the workbook, oldest save first
+        "writer": ThreadPoolExecutor(max_workers=1, thread_name_prefix="excel-writer"),
+        "lock": threading.Lock(),  # held while a copy is written and stamped (see write_excel_copy / load_data)
+        "queued": {},  # session id -> that session's latest queued write
+    }
+
+    def _flush_at_exit():
+        # Every session with outstanding frames is written, in save order, so the latest save lands last
+        for frames in list(registry["frames"].values()):
+            write_excel_copy(*frames)
+
+    atexit.register(_flush_at_exit)
+    return registry
+
+
+def mark_excel_synced():
+    """Forget pending changes once the Excel workbook matches the session's data."""
+    st.session_state.pending_changes = 0
+    st.session_state.pop('excel_write_future', None)
+    excel_sync_registry()["frames"].pop(session_key(), None)
+
+
+def session_key() -> str:
+    """Id of the browser session running this script (empty outside a Streamlit run)."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else ""
+
+
+def queue_workbook_write(df_emp: pd.DataFrame, df_dept: pd.DataFrame, df_users: pd.DataFrame):
+    """Write the workbook on the background writer thread and return its Future.
+
+    The frames are copied first so later in-place edits in this session can't change
+    what the writer is serializing. A write this session queued earlier that is still
+    waiting is cancelled, since this one carries the same session's newer data. Other
+    sessions' writes hold their own data and are left alone.
+    """
+    frames = (df_emp.copy(), df_dept.copy(), df_users.copy())
+    queued = excel_sync_registry()["queued"]
+    for key in [k for k, f in queued.items() if f.done()]:
+        del queued[key]
+    key = session_key()
+    if key in queued:
+        queued[key].cancel()  # no-op once that write has started
+    queued[key] = excel_sync_registry()["writer"].submit(write_excel_copy, *frames)
+    return queued[key]
+
+
+def refresh_employee_index():
+    """Rebuild the Row ID (int) and Employee ID lookups if the employee data changed since they were built."""
+    if st.session_state.get('emp_index_version') == st.session_state._data_version:
+        return
+    df = st.session_state.df_emp
+    st.session_state.row_id_index = dict(zip(df["Row ID"].tolist(), df.index))
+    # Employee ID / Extension -> index label of the first matching row (reversed so the first occurrence wins).
+    # Both are text columns with blanks as "" since load, so they are zipped as-is rather than re-cast with astype(str)
+    st.session_state.emp_id_index = dict(zip(df["Employee ID"][::-1], df.index[::-1]))
+    st.session_state.extension_index = dict(zip(df["Extension"][::-1], df.index[::-1]))
+    st.session_state.dept_counts = department_counts(df)
+    # Row positions per department from one hashed groupby, so per-department lists skip a full-column compare each
+    st.session_state.dept_positions = df.groupby("Department", sort=False).indices
+    # Existing IDs / extensions as Indexes: their hash table is built once per data version and reused by
+    # every membership test and bulk-upload lookup until the next save
+    st.session_state.emp_id_keys = pd.Index(list(st.session_state.emp_id_index))
+    st.session_state.extension_keys = pd.Index(list(st.session_state.extension_index))
+    # Lowercased copy of every column (same index as df_emp) so case-insensitive searches are plain substring matches;
+    # kept Arrow-backed so contains() runs Arrow's match_substring kernel rather than a per-cell Python loop
+    st.session_state.emp_search_lc = pd.DataFrame({c: df[c].astype(STRING_DTYPE).str.lower() for c in EMP_COLUMNS}, index=df.index)
+    st.session_state.emp_index_version = st.session_state._data_version
+
+
+def refresh_department_index(df_dept: pd.DataFrame):
+    """Rebuild the department option list, name set and lowercased names if departments changed since they were built."""
+    if st.session_state.get('dept_options_version') == st.session_state._dept_version:
+        return
+    st.session_state.dept_options = department_options(df_dept)
+    st.session_state.dept_names_set = set(df_dept["Department Name"])
+    st.session_state.dept_names_lc = df_dept["Department Name"].astype(STRING_DTYPE).str.lower()
+    st.session_state.dept_names_lc_set = set(st.session_state.dept_names_lc)
+    st.session_state.dept_options_version = st.session_state._dept_version
+
+
+def contains_lc(lowered: pd.Series, term: str) -> pd.Series:
+    """Case-insensitive literal substring match against a pre-lowercased column."""
+    return lowered.str.contains(term.lower(), na=False, regex=False)
+
+
+def flush_pending_writes() -> bool:
+    """Copy pending changes to the Excel workbook once edits have settled for EXCEL_SYNC_DELAY seconds.
+
+    Only checked when the script reruns, so the copy is queued by the first interaction after
+    the delay (or written at shutdown by the atexit hook), not the moment the delay ends.
+    The write runs on the background writer so this rerun isn't blocked while the workbook
+    is serialized; its outcome is picked up on a later rerun.
+    """
+    future = st.session_state.get('excel_write_future')
+    if future is not None:
+        if not future.done():
+            return False
+        del st.session_state.excel_write_future
+        if future.cancelled():
+            pass  # it never ran, so its changes stay pending for the next attempt
+        elif future.exception() is not None:
+            st.sidebar.warning(f"⚠️ Could not update {EXCEL_PATH}, will retry: {future.exception()}")
+        else:
+            # Saves made while the write was running stay pending for the next one
+            st.session_state.pending_changes -= st.session_state.excel_write_count
+            if not st.session_state.pending_changes:
+                excel_sync_registry()["frames"].pop(session_key(), None)
+    if not st.session_state.pending_changes:
+        return False
+    if time.time() - st.session_state.last_change_time < EXCEL_SYNC_DELAY:
+        return False
+    st.session_state.excel_write_future = queue_workbook_write(
+        st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users
+    )
+    st.session_state.excel_write_count = st.session_state.pending_changes
+    return True
+
+
+def write_excel_copy(df_emp: pd.DataFrame, df_dept: pd.DataFrame, df_users: pd.DataFrame):
+    """Copy the app's data to EXCEL_PATH, then bring the store's mtimes up to the workbook's.
+
+    Without that, the copy would look like an outside edit to load_data() and be re-imported
+    over the store, which may already hold newer saves than this snapshot (the frames are
+    copied when the write is queued, and the session can keep saving while it runs).
+    """
+    with excel_sync_registry()["lock"]:
+        write_workbook(EXCEL_PATH, df_emp, df_dept, df_users)
+        written = os.path.getmtime(EXCEL_PATH)
+        for path in STORE_PATHS.values():
+            stat = file_stat(path)
+            if stat is not None and stat.st_mtime < written:
+                os.utime(path, (stat.st_atime, written))
 
 
 def write_workbook(path: str, df_emp: pd.DataFrame, df_dept: pd.DataFrame, df_users: pd.DataFrame = None):
     """Write three sheets to an Excel workbook atomically."""
-    # Ensure consistent data types before writing
-    df_emp_copy = df_emp.copy()
-    df_dept_copy = df_dept.copy()
-    
-    # Convert Row ID to int where possible, keep as string otherwise
-    if "Row ID" in df_emp_copy.columns:
-        df_emp_copy["Row ID"] = df_emp_copy["Row ID"].astype(str)
-    
-    # Ensure Dept ID is string
-    if "Dept ID" in df_dept_copy.columns:
-        df_dept_copy["Dept ID"] = df_dept_copy["Dept ID"].astype(str)
+    # Row ID and Dept ID are written as text; assign() shares the other columns instead of copying them
+    if "Row ID" in df_emp.columns:
+        df_emp = df_emp.assign(**{"Row ID": df_emp["Row ID"].astype(str)})
+    if "Dept ID" in df_dept.columns:
+        df_dept = df_dept.assign(**{"Dept ID": df_dept["Dept ID"].astype(str)})
     
     # If no users provided, try to read existing or create default
     if df_users is None:
         try:
-            existing_xls = pd.read_excel(path, sheet_name=None, engine="openpyxl")
-            df_users = existing_xls.get(USERS_SHEET, init_default_users())
+            df_users = pd.read_excel(path, sheet_name=USERS_SHEET, engine=EXCEL_READ_ENGINE)
         except:
             df_users = init_default_users()
-    
-    df_users_copy = df_users.copy()
-    
-    # Create temp file in the same directory as target to avoid cross-device issues
+
+    # Temp file lives next to the target so os.replace is a single same-filesystem rename
     target_dir = os.path.dirname(os.path.abspath(path))
     tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx", dir=target_dir)
     try:
-        with pd.ExcelWriter(tmp.name, engine="openpyxl") as writer:
-            df_emp_copy.to_excel(writer, sheet_name=EMP_SHEET, index=False)
-            df_dept_copy.to_excel(writer, sheet_name=DEPT_SHEET, index=False)
-            df_users_copy.to_excel(writer, sheet_name=USERS_SHEET, index=False)
         tmp.close()
-        # Use shutil.move for cross-filesystem compatibility
-        shutil.move(tmp.name, path)
-    except Exception as e:
-        # Clean up temp file on error
+        write_excel(tmp.name, {EMP_SHEET: df_emp, DEPT_SHEET: df_dept, USERS_SHEET: df_users})
+        os.replace(tmp.name, path)
+    except BaseException:
+        # Don't leave orphaned temp workbooks behind (including on interrupt)
         if os.path.exists(tmp.name):
             os.unlink(tmp.name)
-        raise e
+        raise
+    finally:
+        # Drop cached reads so the next read_workbook sees the new file
+        _read_workbook_cached.clear()
+
+
+def write_excel(target, sheets: dict):
+    """Write {sheet name: DataFrame} to an xlsx path or buffer, preferring FastExcel.
+
+    The openpyxl fallback uses a write-only workbook, which streams rows to XML instead of
+    building the full cell tree in memory. (openpyxl's docs advise against write-only mode on PyPy.)
+    """
+    if FastExcel is not None:
+        writer = FastExcel(target, autofit=False)
+        for sheet_name, df in sheets.items():
+            writer.sheet(sheet_name, df)
+        writer.save()
+        return
+    wb = Workbook(write_only=True)
+    for sheet_name, df in sheets.items():
+        ws = wb.create_sheet(sheet_name)
+        ws.append([str(c) for c in df.columns])
+        # Missing values become empty cells; openpyxl can't write pd.NA
+        for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+            ws.append(row)
+    wb.save(target)
+
+
+def excel_bytes(df: pd.DataFrame, sheet_name: str = EMP_SHEET) -> bytes:
+    """Serialize a single sheet to xlsx bytes for download."""
+    output = BytesIO()
+    write_excel(output, {sheet_name: df})
+    return output.getvalue()
+
+
+def csv_bytes(df: pd.DataFrame) -> bytes:
+    """Serialize a DataFrame to UTF-8 CSV bytes with Arrow's C++ writer."""
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed-type object columns (e.g. straight after a bulk import) can't become Arrow arrays
+        return df.to_csv(index=False).encode('utf-8')
+    buf = pa.BufferOutputStream()
+    pacsv.write_csv(table, buf, pacsv.WriteOptions(quoting_style="needed"))
+    return buf.getvalue().to_pybytes()
+
+
+@st.cache_data(show_spinner=False)
+def import_template_bytes() -> bytes:
+    """CSV bytes of the bulk-upload template (one sample row), built once per process."""
+    template_df = pd.DataFrame(
+        [["EMP001", "John Doe", "1234", "IT", "+1234567890", "New York", "Active", "Sample employee"]],
+        columns=["Employee ID", "Name", "Extension", "Department", "Cell Number", "Location", "Status", "Notes"],
+    )
+    return template_df.to_csv(index=False).encode('utf-8')
+
+
+def append_row(df: pd.DataFrame, row: dict) -> pd.DataFrame:
+    """Return df with one row appended under the next index label, keeping every column's dtype.
+
+    This is a full copy of df, like any single-row append in pandas: setting with enlargement
+    (df.loc[n] = row) reallocates every column too, and can turn the Arrow string columns into
+    object. Concatenating a one-row frame cast to df's dtypes costs the same and keeps them.
+    What avoids per-row copies is batching, as bulk import does, not this helper.
+    """
+    label = df.index.max() + 1 if len(df) else 0
+    new_row = pd.DataFrame([row], columns=df.columns, index=[label]).astype(df.dtypes.to_dict())
+    return pd.concat([df, new_row])
 
 
 def next_row_id(df_emp: pd.DataFrame):
     """Generate next Row ID (auto-increment internal ID)."""
     if df_emp.empty or "Row ID" not in df_emp.columns:
         return 1
-    existing = df_emp["Row ID"].dropna()
-    if existing.empty:
-        return 1
-    try:
-        return int(existing.max()) + 1
-    except Exception:
-        return len(df_emp) + 1
+    highest = pd.to_numeric(df_emp["Row ID"], errors="coerce").max()
+    return 1 if pd.isna(highest) else int(highest) + 1
+
+
+def department_counts(df_emp: pd.DataFrame) -> dict:
+    """Employees per department name, from one value_counts pass."""
+    return df_emp["Department"].value_counts().to_dict()
+
+
+def department_options(df_dept: pd.DataFrame) -> list:
+    """Sorted, de-duplicated department names for select boxes."""
+    names = df_dept["Department Name"].unique().tolist()
+    return sorted(d for d in names if d and d != 'nan')
 
 
 def next_dept_id(df_dept: pd.DataFrame):
-    existing = df_dept["Dept ID"].dropna().astype(str).str.extract(r"(\d+)")[0]
-    if existing is None or existing.dropna().empty:
-        return "1"
-    try:
-        return str(existing.dropna().astype(int).max() + 1)
-    except Exception:
-        return str(len(df_dept) + 1)
+    highest = pd.to_numeric(df_dept["Dept ID"], errors="coerce").max()
+    # Non-numeric IDs (hand-edited workbooks) fall back to counting rows
+    return str(len(df_dept) + 1) if pd.isna(highest) else str(int(highest) + 1)
+
+
+def department_rename_conflicts(claims: list) -> list:
+    """Names in a set of (old_name, new_name) claims that can't all be applied in one pass.
+
+    A name conflicts when two actions send it to different departments (a merge that keeps
+    the name counts as sending it to itself), or when one action renames it away while
+    another renames rows into it (chains and swaps).
+    """
+    targets = {}
+    for old, new in claims:
+        targets.setdefault(old, set()).add(new)
+    renamed = {(old, new) for old, new in claims if old != new}
+    conflicts = {old for old, new in targets.items() if len(new) > 1}
+    conflicts |= {old for old, _ in renamed} & {new for _, new in renamed}
+    return sorted(conflicts)
+
+
+def apply_department_renames(df_emp: pd.DataFrame, rename_map: dict, ts: str) -> pd.Series:
+    """Rewrite employee departments per {old_name: new_name} in one pass; returns rows moved per old name.
+
+    Each row is looked up once by its current name, so A -> B and B -> C moves A's rows to B, not C.
+    """
+    if not rename_map:
+        return pd.Series(dtype="int64")
+    # One hashed isin scan finds every affected row; the same slice gives the per-name counts
+    old_names = df_emp.loc[df_emp["Department"].isin(list(rename_map)), "Department"]
+    if len(old_names):
+        df_emp.loc[old_names.index, "Department"] = old_names.map(rename_map)
+        df_emp.loc[old_names.index, "Last Updated"] = ts
+    return old_names.value_counts()
 
 
 # --------------------------- Streamlit UI ---------------------------
 
 st.set_page_config(page_title="Excel Active Directory Portal", layout="wide", initial_sidebar_state="expanded")
 
-# Add viewport meta tag for better mobile responsiveness
+# Viewport meta tag and custom CSS for responsive styling.
+# Streamlit drops elements that are not re-emitted on a rerun, so this has to be sent every run;
+# keeping all head markup (including the edit-form keyframes) in this one element keeps that to a single delta.
 st.markdown("""
 <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=5.0, user-scalable=yes">
-""", unsafe_allow_html=True)
-
-# Custom CSS for responsive styling
-st.markdown("""
 <style>
     /* ==================== ROOT VARIABLES ==================== */
     :root {
@@ -823,9 +1201,6 @@ st.markdown("""
 
 st.markdown('<div class="main-header"><h1>🔐 Excel Active Directory Portal</h1><p style="font-size: 0.9em; opacity: 0.8; margin-top: 0.5rem;">Enterprise User & Department Management System</p></div>', unsafe_allow_html=True)
 
-# Ensure workbook exists
-ensure_workbook(EXCEL_PATH)
-
 # Initialize session state for authentication
 if 'user' not in st.session_state:
     st.session_state.user = None
@@ -835,10 +1210,8 @@ if 'show_login' not in st.session_state:
 
 # Initialize session state
 if 'df_emp' not in st.session_state or 'df_dept' not in st.session_state or 'df_users' not in st.session_state:
-    st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users = read_workbook(EXCEL_PATH)
-    # Save back if we added Row IDs or created default users
-    if not st.session_state.df_emp.empty or not st.session_state.df_users.empty:
-        write_workbook(EXCEL_PATH, st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+    # Importing from Excel writes the store, which keeps any Row IDs or default users we added
+    st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users = load_data()
     
 if 'edit_mode' not in st.session_state:
     st.session_state.edit_mode = False
@@ -882,7 +1255,25 @@ if 'show_dept_manage' not in st.session_state:
 if 'dept_manage_actions' not in st.session_state:
     st.session_state.dept_manage_actions = {}
 
+# Number of saves not yet copied to the Excel workbook
+if 'pending_changes' not in st.session_state:
+    st.session_state.pending_changes = 0
+    st.session_state.last_change_time = 0.0
+
+# Bumped whenever employees or departments may have changed, so derived lookups can be rebuilt
+if '_data_version' not in st.session_state:
+    st.session_state._data_version = 0
+    st.session_state._dept_version = 0
+
+# Bring the Excel copy up to date if a burst of edits settled before this rerun
+flush_pending_writes()
+
+# Result of an action that finished just before its rerun (see the bulk import and department apply handlers)
+if 'flash_message' in st.session_state:
+    st.toast(st.session_state.pop('flash_message'), icon="🎉")
+
 # Read data from session state
+refresh_employee_index()
 df_emp = st.session_state.df_emp
 df_dept = st.session_state.df_dept
 df_users = st.session_state.df_users
@@ -944,13 +1335,28 @@ st.sidebar.header("⚙️ Controls & Actions")
 
 # Reload button - available to all logged-in users
 if is_logged_in():
-    if st.sidebar.button("🔄 Reload from Excel", use_container_width=True):
+    if st.sidebar.button("🔄 Reload from Excel", use_container_width=True, help=f"Replace current data with the contents of {EXCEL_PATH}"):
+        # Let queued background writes land first so they can't overwrite what is reloaded
+        excel_sync_registry()["writer"].submit(lambda: None).result()
         st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users = read_workbook(EXCEL_PATH)
+        write_store(st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+        mark_excel_synced()  # the workbook is now the source of truth
+        st.session_state._data_version += 1
+        st.session_state._dept_version += 1
         st.rerun()
 
-    if st.sidebar.button("💾 Save to Excel", use_container_width=True):
-        write_workbook(EXCEL_PATH, df_emp, df_dept, df_users)
-        st.sidebar.success("✅ Saved to Excel.")
+    if st.sidebar.button("💾 Save to Excel", use_container_width=True, help=f"Export current data to {EXCEL_PATH}"):
+        # Queued behind any background write, then waited on so the success message is accurate
+        save_future = queue_workbook_write(df_emp, df_dept, df_users)
+        wait([save_future])
+        if save_future.cancelled():
+            st.sidebar.warning(f"⚠️ The save to {EXCEL_PATH} was cancelled before it ran; your changes are still pending.")
+        else:
+            save_future.result()
+            mark_excel_synced()
+            st.sidebar.success("✅ Saved to Excel.")
+    elif st.session_state.pending_changes:
+        st.sidebar.caption(f"📝 {st.session_state.pending_changes} unsaved change(s) will be copied to {EXCEL_PATH} on your next action after {EXCEL_SYNC_DELAY}s, or at shutdown")
 else:
     st.sidebar.info("🔒 Login to access controls")
 
@@ -959,11 +1365,12 @@ if is_admin():
     st.sidebar.markdown("---")
     st.sidebar.markdown("### ⚡ Bulk Actions")
     if st.sidebar.button("🔄 Activate All Inactive", use_container_width=True, help="Set all inactive users to active"):
-        inactive_count = len(st.session_state.df_emp[st.session_state.df_emp['Status'] == 'Inactive'])
+        inactive_mask = st.session_state.df_emp['Status'].eq('Inactive')
+        inactive_count = int(inactive_mask.sum())
         if inactive_count > 0:
-            st.session_state.df_emp.loc[st.session_state.df_emp['Status'] == 'Inactive', 'Status'] = 'Active'
-            st.session_state.df_emp.loc[st.session_state.df_emp['Status'] == 'Active', 'Last Updated'] = datetime.utcnow().isoformat()
-            write_workbook(EXCEL_PATH, st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+            # Only stamp the rows that actually changed
+            st.session_state.df_emp.loc[inactive_mask, ['Status', 'Last Updated']] = ['Active', utc_now_iso()]
+            save_data(structural=False)
             st.sidebar.success(f"✅ Activated {inactive_count} user(s)")
             st.rerun()
         else:
@@ -972,10 +1379,9 @@ if is_admin():
     # Export is allowed for all logged-in users
 if is_logged_in():
     if st.sidebar.button("📧 Export User List (CSV)", use_container_width=True, help="Download complete user list"):
-        csv_data = st.session_state.df_emp.to_csv(index=False).encode('utf-8')
         st.sidebar.download_button(
             "⬇️ Download CSV",
-            csv_data,
+            partial(csv_bytes, st.session_state.df_emp),
             file_name=f"user_list_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
             mime="text/csv",
             use_container_width=True
@@ -1000,8 +1406,9 @@ if is_admin():
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 📊 Quick Stats")
 total_users = len(df_emp)
-active_users = len(df_emp[df_emp['Status'] == 'Active'])
-inactive_users = len(df_emp[df_emp['Status'] == 'Inactive'])
+status_counts = df_emp['Status'].value_counts()
+active_users = int(status_counts.get('Active', 0))
+inactive_users = int(status_counts.get('Inactive', 0))
 
 col_s1, col_s2 = st.sidebar.columns(2)
 with col_s1:
@@ -1029,34 +1436,22 @@ if 'clear_filters_counter' not in st.session_state:
 
 filter_key_suffix = f"_{st.session_state.clear_filters_counter}"
 
-# Use session state for search with debouncing
-if 'search_name' not in st.session_state:
-    st.session_state.search_name = ""
-if 'search_ext' not in st.session_state:
-    st.session_state.search_ext = ""
-if 'search_empid' not in st.session_state:
-    st.session_state.search_empid = ""
-if 'search_loc' not in st.session_state:
-    st.session_state.search_loc = ""
-if 'last_update_time' not in st.session_state:
-    st.session_state.last_update_time = time.time()
-
-name_filter = st.sidebar.text_input("Name contains", key=f"name_filter_input{filter_key_suffix}")
-ext_filter = st.sidebar.text_input("Extension", key=f"ext_filter_input{filter_key_suffix}")
-empid_filter = st.sidebar.text_input("Employee ID", key=f"empid_filter_input{filter_key_suffix}")
-loc_filter = st.sidebar.text_input("Location contains", key=f"loc_filter_input{filter_key_suffix}")
-status_filter = st.sidebar.selectbox("Status", options=["Any", "Active", "Inactive"], index=0, key=f"status_filter{filter_key_suffix}")
-
-# Department filter with multiselect
-# Re-read Departments from the saved workbook to ensure options reflect persisted data only
-try:
-    _wl_emp, _wl_dept, _wl_users = read_workbook(EXCEL_PATH)
-    persisted_dept_names = _wl_dept["Department Name"].dropna().astype(str).str.strip().unique().tolist()
-except Exception:
-    persisted_dept_names = df_dept["Department Name"].dropna().astype(str).str.strip().unique().tolist()
-
-dept_options = sorted([d for d in persisted_dept_names if d and d != 'nan'])
-selected_depts = st.sidebar.multiselect("Department", options=dept_options, key=f"dept_filter{filter_key_suffix}")
+# Filters live in a form so editing several of them costs one rerun when applied, not one per widget
+# Session state mirrors the store; the department list is rebuilt only after departments may have changed
+refresh_department_index(df_dept)
+dept_options = st.session_state.dept_options
+emp_lc = st.session_state.emp_search_lc
+dept_names_lc = st.session_state.dept_names_lc
+dept_names_lc_set = st.session_state.dept_names_lc_set
+
+with st.sidebar.form(f"filters_form{filter_key_suffix}", border=False):
+    name_filter = st.text_input("Name contains", key=f"name_filter_input{filter_key_suffix}")
+    ext_filter = st.text_input("Extension", key=f"ext_filter_input{filter_key_suffix}")
+    empid_filter = st.text_input("Employee ID", key=f"empid_filter_input{filter_key_suffix}")
+    loc_filter = st.text_input("Location contains", key=f"loc_filter_input{filter_key_suffix}")
+    status_filter = st.selectbox("Status", options=["Any", "Active", "Inactive"], index=0, key=f"status_filter{filter_key_suffix}")
+    selected_depts = st.multiselect("Department", options=dept_options, key=f"dept_filter{filter_key_suffix}")
+    st.form_submit_button("🔍 Apply Filters", use_container_width=True)
 
 # Dashboard Metrics - Responsive Card Layout
 st.markdown("""
@@ -1106,20 +1501,22 @@ col1, col2 = st.columns([3, 1])
 with col1:
     st.subheader("📋 Employee Directory")
 
-    # Apply filters
-    df_view = df_emp.copy()
+    # Apply filters as one combined mask of literal (non-regex) matches
+    filter_mask = pd.Series(True, index=df_emp.index)
     if name_filter:
-        df_view = df_view[df_view["Name"].str.contains(name_filter, case=False, na=False)]
+        filter_mask &= contains_lc(emp_lc["Name"], name_filter)
     if ext_filter := ext_filter.strip():
-        df_view = df_view[df_view["Extension"].astype(str).str.contains(ext_filter, na=False)]
+        filter_mask &= df_emp["Extension"].str.contains(ext_filter, na=False, regex=False)
     if empid_filter:
-        df_view = df_view[df_view["Employee ID"].astype(str).str.contains(empid_filter, na=False)]
+        filter_mask &= df_emp["Employee ID"].str.contains(empid_filter, na=False, regex=False)
     if loc_filter:
-        df_view = df_view[df_view["Location"].str.contains(loc_filter, case=False, na=False)]
+        filter_mask &= contains_lc(emp_lc["Location"], loc_filter)
     if status_filter != "Any":
-        df_view = df_view[df_view["Status"] == status_filter]
+        filter_mask &= df_emp["Status"] == status_filter
     if selected_depts:
-        df_view = df_view[df_view["Department"].isin(selected_depts)]
+        filter_mask &= df_emp["Department"].isin(selected_depts)
+    # Without an active filter the view is just the full frame; no need to materialise a copy
+    df_view = df_emp if filter_mask.all() else df_emp[filter_mask]
 
     # Global search bar at top with clear button
     col_quick1, col_quick2 = st.columns([4, 1])
@@ -1136,8 +1533,11 @@ with col1:
             st.rerun()
     
     if global_search:
-        # Search across all string columns
-        mask = df_view.apply(lambda row: row.astype(str).str.contains(global_search, case=False, na=False).any(), axis=1)
+        # Search across all columns: one vectorized literal match per column, OR-ed together
+        view_lc = emp_lc if df_view is df_emp else emp_lc.loc[df_view.index]
+        mask = np.zeros(len(df_view), dtype=bool)
+        for c in view_lc.columns:
+            mask |= contains_lc(view_lc[c], global_search).to_numpy()
         df_view = df_view[mask]
 
     # Pagination controls
@@ -1191,6 +1591,8 @@ with col1:
         start_idx = st.session_state.page_number * rows_per_page
         end_idx = min(start_idx + rows_per_page, total_rows)
         df_page = df_view.iloc[start_idx:end_idx]
+        # Plain dicts are much cheaper to iterate than the Series that iterrows() builds per row
+        page_rows = list(zip(df_page.index, df_page.to_dict(orient="records")))
         
         # Add view toggle (mobile-friendly card view vs table view)
         view_mode = st.radio("📱 View Mode:", ["Cards (Mobile-Friendly)", "Table (Desktop)"], horizontal=True, key="view_mode", help="Cards view is optimized for mobile devices")
@@ -1200,7 +1602,7 @@ with col1:
             st.markdown(f"**📋 Showing {len(df_page)} of {len(df_view)} employee(s) | Page {st.session_state.page_number + 1}/{total_pages}**")
             st.markdown("---")
             
-            for display_idx, (idx, row) in enumerate(df_page.iterrows(), start=start_idx + 1):
+            for display_idx, (idx, row) in enumerate(page_rows, start=start_idx + 1):
                 status_class = "active" if row['Status'] == 'Active' else "inactive"
                 status_badge = f'<span class="status-badge {status_class}">{row["Status"]}</span>'
                 
@@ -1233,7 +1635,7 @@ with col1:
                     with col_action1:
                         if st.button("✏️ Edit", key=f"edit_card_{idx}_{display_idx}", use_container_width=True):
                             st.session_state.edit_mode = True
-                            st.session_state.edit_id = row['Row ID']
+                            st.session_state.edit_id = int(row['Row ID'])
                             st.session_state.scroll_to_edit = True
                             st.rerun()
                     with col_action2:
@@ -1241,9 +1643,8 @@ with col1:
                         new_status = "Inactive" if row['Status'] == 'Active' else "Active"
                         status_icon = "⏸️" if row['Status'] == 'Active' else "▶️"
                         if st.button(f"{status_icon} {new_status}", key=f"toggle_card_{idx}_{display_idx}", use_container_width=True):
-                            st.session_state.df_emp.at[idx, 'Status'] = new_status
-                            st.session_state.df_emp.at[idx, 'Last Updated'] = datetime.utcnow().isoformat()
-                            write_workbook(EXCEL_PATH, st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+                            st.session_state.df_emp.loc[idx, ['Status', 'Last Updated']] = [new_status, utc_now_iso()]
+                            save_data(structural=False)
                             st.rerun()
                 else:
                     st.caption("🔒 Login as admin to edit")
@@ -1273,7 +1674,7 @@ with col1:
             st.markdown("---")
             
             # Data rows in scrollable container
-            for display_idx, (idx, row) in enumerate(df_page.iterrows(), start=start_idx + 1):
+            for display_idx, (idx, row) in enumerate(page_rows, start=start_idx + 1):
                 cols = st.columns([0.4, 0.8, 1.5, 1, 1.2, 0.8, 1.2, 0.8, 1, 0.6])
                 
                 # Display row data
@@ -1298,7 +1699,7 @@ with col1:
                 if is_admin():
                     if cols[9].button("✏️", key=f"edit_{idx}_{display_idx}", help="Edit this employee"):
                         st.session_state.edit_mode = True
-                        st.session_state.edit_id = row['Row ID']
+                        st.session_state.edit_id = int(row['Row ID'])
                         st.session_state.scroll_to_edit = True
                         st.rerun()
                 else:
@@ -1315,18 +1716,13 @@ with col1:
     st.markdown("---")
     st.markdown("**📥 Export Data**")
     col_dl1, col_dl2, col_dl3 = st.columns(3)
+    # Export payloads are callables, so they are only generated when a button is clicked
+    export_stamp = datetime.now().strftime('%Y%m%d_%H%M%S')  # one clock read shared by the three file names
     with col_dl1:
-        # Generate Excel data on button click
-        def generate_excel_filtered():
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                df_view.to_excel(writer, index=False, sheet_name=EMP_SHEET)
-            return output.getvalue()
-        
         st.download_button(
             "📊 Excel (Filtered)", 
-            data=generate_excel_filtered(),
-            file_name=f"filtered_employees_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx", 
+            data=partial(excel_bytes, df_view),
+            file_name=f"filtered_employees_{export_stamp}.xlsx", 
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", 
             use_container_width=True,
             key="download_excel_filtered"
@@ -1334,24 +1730,18 @@ with col1:
     with col_dl2:
         st.download_button(
             "📄 CSV (Filtered)", 
-            data=df_view.to_csv(index=False).encode('utf-8'), 
-            file_name=f"filtered_employees_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv", 
+            data=partial(csv_bytes, df_view), 
+            file_name=f"filtered_employees_{export_stamp}.csv", 
             mime="text/csv", 
             use_container_width=True,
             key="download_csv_filtered"
         )
     with col_dl3:
         # Export all data
-        def generate_excel_all():
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                df_emp.to_excel(writer, index=False, sheet_name=EMP_SHEET)
-            return output.getvalue()
-        
         st.download_button(
             "📊 Excel (All)", 
-            data=generate_excel_all(),
-            file_name=f"all_employees_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx", 
+            data=partial(excel_bytes, df_emp),
+            file_name=f"all_employees_{export_stamp}.xlsx", 
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", 
             use_container_width=True,
             key="download_excel_all"
@@ -1364,7 +1754,7 @@ with col1:
     edit_container = st.container()
     
     with edit_container:
-        if st.session_state.edit_mode and st.session_state.edit_id:
+        if st.session_state.edit_mode and st.session_state.edit_id is not None:
             # Add visual separator and highlight with unique ID
             st.markdown("---")
             st.markdown('<div id="employee-edit-form-anchor"></div>', unsafe_allow_html=True)
@@ -1379,12 +1769,6 @@ with col1:
                     Make your changes below and click Save
                 </p>
             </div>
-            <style>
-                @keyframes highlight-pulse {
-                    0%, 100% { box-shadow: 0 0 0 0 rgba(102, 126, 234, 0.7); }
-                    50% { box-shadow: 0 0 20px 10px rgba(102, 126, 234, 0.3); }
-                }
-            </style>
             """, unsafe_allow_html=True)
             
             # Enhanced JavaScript to scroll to this section
@@ -1412,7 +1796,8 @@ with col1:
                 """, unsafe_allow_html=True)
                 st.session_state.scroll_to_edit = False
             
-            matched = df_emp[df_emp["Row ID"].astype(str) == str(st.session_state.edit_id)]
+            edit_idx = st.session_state.row_id_index.get(st.session_state.edit_id)
+            matched = df_emp.loc[[edit_idx]] if edit_idx is not None else df_emp.iloc[0:0]
             if not matched.empty:
                 row = matched.iloc[0]
                 with st.form("edit_form"):
@@ -1449,54 +1834,27 @@ with col1:
                         else:
                             idx = matched.index[0]
                             new_employee_id = new_employee_id.strip()
-                            # Check if new Employee ID is different and already exists
-                            if new_employee_id != str(row["Employee ID"]):
-                                # Only check for duplicates if Employee ID is provided
-                                if new_employee_id and new_employee_id in st.session_state.df_emp["Employee ID"].astype(str).values:
-                                    st.error(f"⚠️ Employee ID '{new_employee_id}' already exists! Please use a different ID.")
-                                else:
-                                    # Preserve Row ID if it exists
-                                    if "Row ID" not in st.session_state.df_emp.columns or pd.isna(st.session_state.df_emp.at[idx, "Row ID"]):
-                                        st.session_state.df_emp.at[idx, "Row ID"] = next_row_id(st.session_state.df_emp)
-                                    
-                                    st.session_state.df_emp.at[idx, "Employee ID"] = str(new_employee_id) if new_employee_id else ""
-                                    st.session_state.df_emp.at[idx, "Name"] = str(name).strip()
-                                    st.session_state.df_emp.at[idx, "Extension"] = str(extension).strip()
-                                    st.session_state.df_emp.at[idx, "Department"] = str(department).strip() if department else ""
-                                    st.session_state.df_emp.at[idx, "Cell Number"] = str(cell).strip() if cell and str(cell).strip() else ""
-                                    # Fix FutureWarning: Handle NaN explicitly before assignment
-                                    location_val = "" if pd.isna(location) or not str(location).strip() or str(location).strip() == 'nan' else str(location).strip()
-                                    st.session_state.df_emp.at[idx, "Location"] = location_val
-                                    st.session_state.df_emp.at[idx, "Status"] = str(status)
-                                    # Fix FutureWarning: Handle NaN explicitly before assignment
-                                    notes_val = "" if pd.isna(notes) or not str(notes).strip() or str(notes).strip() == 'nan' else str(notes).strip()
-                                    st.session_state.df_emp.at[idx, "Notes"] = notes_val
-                                    st.session_state.df_emp.at[idx, "Last Updated"] = datetime.utcnow().isoformat()
-                                    write_workbook(EXCEL_PATH, st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
-                                    st.success("✅ Saved changes to employee and updated Excel.")
-                                    # Clear edit mode BEFORE rerun
-                                    st.session_state.edit_mode = False
-                                    st.session_state.edit_id = None
-                                    time.sleep(0.3)  # Brief pause to show success message
-                                    st.rerun()
+                            # Only check for duplicates if the Employee ID was changed to a non-empty value
+                            if new_employee_id != str(row["Employee ID"]) and new_employee_id and new_employee_id in st.session_state.emp_id_keys:
+                                st.error(f"⚠️ Employee ID '{new_employee_id}' already exists! Please use a different ID.")
                             else:
-                                # Preserve Row ID if it exists
-                                if "Row ID" not in st.session_state.df_emp.columns or pd.isna(st.session_state.df_emp.at[idx, "Row ID"]):
-                                    st.session_state.df_emp.at[idx, "Row ID"] = next_row_id(st.session_state.df_emp)
-                                
-                                st.session_state.df_emp.at[idx, "Name"] = str(name).strip()
-                                st.session_state.df_emp.at[idx, "Extension"] = str(extension).strip()
-                                st.session_state.df_emp.at[idx, "Department"] = str(department).strip() if department else ""
-                                st.session_state.df_emp.at[idx, "Cell Number"] = str(cell).strip() if cell and str(cell).strip() else ""
-                                # Fix FutureWarning: Handle NaN explicitly before assignment
+                                # Handle NaN explicitly before assignment
                                 location_val = "" if pd.isna(location) or not str(location).strip() or str(location).strip() == 'nan' else str(location).strip()
-                                st.session_state.df_emp.at[idx, "Location"] = location_val
-                                st.session_state.df_emp.at[idx, "Status"] = str(status)
-                                # Fix FutureWarning: Handle NaN explicitly before assignment
                                 notes_val = "" if pd.isna(notes) or not str(notes).strip() or str(notes).strip() == 'nan' else str(notes).strip()
-                                st.session_state.df_emp.at[idx, "Notes"] = notes_val
-                                st.session_state.df_emp.at[idx, "Last Updated"] = datetime.utcnow().isoformat()
-                                write_workbook(EXCEL_PATH, st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+                                updates = {
+                                    "Employee ID": new_employee_id,
+                                    "Name": str(name).strip(),
+                                    "Extension": str(extension).strip(),
+                                    "Department": str(department).strip() if department else "",
+                                    "Cell Number": str(cell).strip() if cell and str(cell).strip() else "",
+                                    "Location": location_val,
+                                    "Status": str(status),
+                                    "Notes": notes_val,
+                                    "Last Updated": utc_now_iso(),
+                                }
+                                # One row assignment instead of a scalar .at write per column
+                                st.session_state.df_emp.loc[idx, list(updates)] = list(updates.values())
+                                save_data(structural=False)
                                 st.success("✅ Saved changes to employee and updated Excel.")
                                 # Clear edit mode BEFORE rerun
                                 st.session_state.edit_mode = False
@@ -1507,7 +1865,7 @@ with col1:
                     if delete_btn:
                         idx = matched.index[0]
                         st.session_state.df_emp = st.session_state.df_emp.drop(index=idx).reset_index(drop=True)
-                        write_workbook(EXCEL_PATH, st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+                        save_data()
                         st.success("🗑️ Deleted employee and updated Excel.")
                         st.session_state.edit_mode = False
                         st.session_state.edit_id = None
@@ -1523,91 +1881,90 @@ with col1:
             if not is_admin():
                 st.info("🔒 Admin access required to edit/delete employees")
             else:
-                st.markdown("**Search by multiple criteria:**")
+                # Fragment: typing a search reruns only this block; Edit still triggers a full rerun to open the form
+                @st.fragment
+                def employee_edit_search():
+                    st.markdown("**Search by multiple criteria:**")
                 
-                search_by = st.radio("Search by:", ["Employee ID", "Name", "Extension", "Cell Number"], horizontal=True)
+                    search_by = st.radio("Search by:", ["Employee ID", "Name", "Extension", "Cell Number"], horizontal=True)
                 
-                if search_by == "Employee ID":
-                    search_value = st.text_input("Enter Employee ID (partial match)")
-                    if search_value:
-                        matched = df_emp[df_emp["Employee ID"].astype(str).str.contains(search_value, case=False, na=False)]
-                elif search_by == "Name":
-                    search_value = st.text_input("Enter Name (partial match)")
-                    if search_value:
-                        matched = df_emp[df_emp["Name"].str.contains(search_value, case=False, na=False)]
-                elif search_by == "Extension":
-                    search_value = st.text_input("Enter Extension (partial match)")
+                    # Each choice is also the column searched; an empty box skips matching entirely
+                    search_value = st.text_input(f"Enter {search_by} (partial match)")
                     if search_value:
-                        matched = df_emp[df_emp["Extension"].astype(str).str.contains(search_value, case=False, na=False)]
-                else:  # Cell Number
-                    search_value = st.text_input("Enter Cell Number (partial match)")
-                    if search_value:
-                        matched = df_emp[df_emp["Cell Number"].astype(str).str.contains(search_value, case=False, na=False)]
-                
-                if 'search_value' in locals() and search_value:
-                    if matched.empty:
-                        st.info("❌ No employee found with that criteria.")
-                    else:
-                        st.success(f"✅ Found {len(matched)} employee(s)")
-                        for idx, row in matched.iterrows():
-                            col1_s, col2_s = st.columns([3, 1])
-                            with col1_s:
-                                st.write(f"**{row['Name']}** - ID: {row['Employee ID']} - Ext: {row['Extension']} - Status: {row['Status']}")
-                            with col2_s:
-                                if st.button(f"✏️ Edit", key=f"select_edit_{idx}"):
-                                    st.session_state.edit_mode = True
-                                    st.session_state.edit_id = row['Row ID']  # Use Row ID instead of Employee ID
-                                    st.session_state.scroll_to_edit = True
-                                    st.rerun()
+                        matched = df_emp[contains_lc(emp_lc[search_by], search_value)]
+                        if matched.empty:
+                            st.info("❌ No employee found with that criteria.")
+                        else:
+                            st.success(f"✅ Found {len(matched)} employee(s)")
+                            for idx, row in matched.iterrows():
+                                col1_s, col2_s = st.columns([3, 1])
+                                with col1_s:
+                                    st.write(f"**{row['Name']}** - ID: {row['Employee ID']} - Ext: {row['Extension']} - Status: {row['Status']}")
+                                with col2_s:
+                                    if st.button(f"✏️ Edit", key=f"select_edit_{idx}"):
+                                        st.session_state.edit_mode = True
+                                        st.session_state.edit_id = int(row['Row ID'])  # Use Row ID instead of Employee ID
+                                        st.session_state.scroll_to_edit = True
+                                        st.rerun()
+
+                employee_edit_search()
     
     # View Departments section - collapsible with search
     st.markdown("---")
     if 'show_dept_view' not in st.session_state:
         st.session_state.show_dept_view = False
     
-    col_dept_btn1, col_dept_btn2 = st.columns([2, 1])
-    with col_dept_btn1:
-        st.subheader("🏢 View Departments")
-    with col_dept_btn2:
-        if st.button("👁️ Toggle View" if st.session_state.show_dept_view else "👁️ Show", key="toggle_dept_view"):
-            st.session_state.show_dept_view = not st.session_state.show_dept_view
-            st.rerun()
-    
-    if st.session_state.show_dept_view:
-        st.info("💡 Use 'Manage Departments' in sidebar for full edit/merge/delete capabilities")
-        
-        # Search departments
-        dept_view_search = st.text_input("🔍 Search departments (partial match)", key="dept_view_search", placeholder="Enter department name...")
-        
-        # Filter departments based on search
-        if dept_view_search:
-            filtered_depts = df_dept[df_dept["Department Name"].str.contains(dept_view_search, case=False, na=False)]
-        else:
-            filtered_depts = df_dept
+    # Read-only view, so its toggle and search rerun only this fragment rather than the whole page
+    @st.fragment
+    def department_view():
+        col_dept_btn1, col_dept_btn2 = st.columns([2, 1])
+        with col_dept_btn1:
+            st.subheader("🏢 View Departments")
+        with col_dept_btn2:
+            # Flipped in a callback so the fragment's own rerun already sees the new state (no st.rerun needed)
+            st.button(
+                "👁️ Toggle View" if st.session_state.show_dept_view else "👁️ Show",
+                key="toggle_dept_view",
+                on_click=lambda: st.session_state.update(show_dept_view=not st.session_state.show_dept_view),
+            )
         
-        # Display in scrollable container
-        if filtered_depts.empty:
-            st.info("❌ No departments found")
-        else:
-            st.success(f"📋 Showing {len(filtered_depts)} department(s)")
-            with st.container(height=400):
-                for idx, dept_row in filtered_depts.iterrows():
-                    dept_name = dept_row["Department Name"]
-                    dept_desc = dept_row["Description"] if dept_row["Description"] and dept_row["Description"] != 'nan' else "No description"
-                    emp_count = len(df_emp[df_emp["Department"].astype(str).str.strip() == dept_name])
-                    
-                    with st.expander(f"🏢 **{dept_name}** ({emp_count} employees)", expanded=False):
-                        st.write(f"**Dept ID:** {dept_row['Dept ID']}")
-                        st.write(f"**Description:** {dept_desc}")
-                        st.write(f"**Employees:** {emp_count}")
+        if st.session_state.show_dept_view:
+            st.info("💡 Use 'Manage Departments' in sidebar for full edit/merge/delete capabilities")
+            
+            # Search departments
+            dept_view_search = st.text_input("🔍 Search departments (partial match)", key="dept_view_search", placeholder="Enter department name...")
+            
+            # Filter departments based on search
+            if dept_view_search:
+                filtered_depts = df_dept[contains_lc(dept_names_lc, dept_view_search)]
+            else:
+                filtered_depts = df_dept
+            
+            # Display in scrollable container
+            if filtered_depts.empty:
+                st.info("❌ No departments found")
+            else:
+                st.success(f"📋 Showing {len(filtered_depts)} department(s)")
+                with st.container(height=400):
+                    for idx, dept_row in filtered_depts.iterrows():
+                        dept_name = dept_row["Department Name"]
+                        dept_desc = dept_row["Description"] if dept_row["Description"] and dept_row["Description"] != 'nan' else "No description"
+                        emp_count = st.session_state.dept_counts.get(dept_name, 0)
                         
-                        if emp_count > 0:
-                            st.markdown("**Assigned Employees:**")
-                            assigned_emps = df_emp[df_emp["Department"].astype(str).str.strip() == dept_name]
-                            for _, emp in assigned_emps.head(10).iterrows():
-                                st.write(f"• {emp['Name']} ({emp.get('Employee ID', 'N/A')}) - Ext: {emp['Extension']}")
-                            if emp_count > 10:
-                                st.write(f"... and {emp_count - 10} more employee(s)")
+                        with st.expander(f"🏢 **{dept_name}** ({emp_count} employees)", expanded=False):
+                            st.write(f"**Dept ID:** {dept_row['Dept ID']}")
+                            st.write(f"**Description:** {dept_desc}")
+                            st.write(f"**Employees:** {emp_count}")
+                            
+                            if emp_count > 0:
+                                st.markdown("**Assigned Employees:**")
+                                # One markdown block (hard line breaks) instead of a Streamlit element per employee
+                                top = df_emp.iloc[st.session_state.dept_positions[dept_name][:10]]
+                                st.markdown("  \n".join(f"• {n} ({i}) - Ext: {e}" for n, i, e in zip(top["Name"], top["Employee ID"], top["Extension"])))
+                                if emp_count > 10:
+                                    st.write(f"... and {emp_count - 10} more employee(s)")
+
+    department_view()
 
 with col2:
     # Quick Add - Admin Only
@@ -1636,7 +1993,7 @@ with col2:
                     eid = new_empid.strip() if new_empid.strip() else ""
                     
                     # Check if Employee ID already exists (only if provided)
-                    if eid and eid in st.session_state.df_emp["Employee ID"].astype(str).values:
+                    if eid and eid in st.session_state.emp_id_keys:
                         st.error(f"⚠️ Employee ID '{eid}' already exists! Please use a different ID.")
                     else:
                         # Generate next Row ID
@@ -1652,10 +2009,10 @@ with col2:
                             "Location": str(new_location).strip() if new_location and str(new_location).strip() else "",
                             "Status": new_status,
                             "Notes": str(new_notes).strip() if new_notes and str(new_notes).strip() else "",
-                            "Last Updated": datetime.utcnow().isoformat()
+                            "Last Updated": utc_now_iso()
                         }
-                        st.session_state.df_emp = pd.concat([st.session_state.df_emp, pd.DataFrame([new_row])], ignore_index=True)
-                        write_workbook(EXCEL_PATH, st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+                        st.session_state.df_emp = append_row(st.session_state.df_emp, new_row)
+                        save_data()
                         st.success(f"✅ Added {new_name} with Employee ID {eid} (Row #{row_id}).")
                         st.rerun()
 
@@ -1671,12 +2028,12 @@ with col2:
                     pass
                 elif not dname.strip():
                     st.error("⚠️ Department name is required!")
-                elif dname.strip().lower() in st.session_state.df_dept["Department Name"].str.lower().values:
+                elif dname.strip().lower() in dept_names_lc_set:
                     st.error(f"⚠️ Department '{dname.strip()}' already exists! Please use a different name.")
                 else:
                     did = next_dept_id(st.session_state.df_dept)
-                    st.session_state.df_dept = pd.concat([st.session_state.df_dept, pd.DataFrame([{"Dept ID": did, "Department Name": dname.strip(), "Description": ddesc.strip()}])], ignore_index=True)
-                    write_workbook(EXCEL_PATH, st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+                    st.session_state.df_dept = append_row(st.session_state.df_dept, {"Dept ID": did, "Department Name": dname.strip(), "Description": ddesc.strip()})
+                    save_data()
                     st.success(f"✅ Added department '{dname.strip()}'")
                     st.rerun()
     else:
@@ -1697,7 +2054,7 @@ with col2:
         edit_dept_search = st.text_input("Enter Department Name (partial match)", key="dept_search_edit")
         if edit_dept_search:
             # Search by partial name match
-            matched_depts = df_dept[df_dept["Department Name"].str.contains(edit_dept_search, case=False, na=False)]
+            matched_depts = df_dept[contains_lc(dept_names_lc, edit_dept_search)]
             
             if matched_depts.empty:
                 st.info("❌ No department found with that name.")
@@ -1706,12 +2063,13 @@ with col2:
                 for idx, dept_row in matched_depts.iterrows():
                     col1_d, col2_d = st.columns([3, 1])
                     with col1_d:
-                        emp_count = len(df_emp[df_emp['Department'] == dept_row['Department Name']])
+                        emp_count = st.session_state.dept_counts.get(dept_row['Department Name'], 0)
                         st.write(f"**{dept_row['Department Name']}** - ID: {dept_row['Dept ID']} - Employees: {emp_count}")
                     with col2_d:
                         if st.button(f"✏️ Edit", key=f"select_dept_edit_{idx}"):
                             st.session_state.edit_dept_mode = True
                             st.session_state.edit_dept_idx = idx
+                            st.session_state.just_opened_dept_edit = True
                             st.rerun()
     
         # Show edit form if department selected (still under admin check)
@@ -1737,26 +2095,28 @@ with col2:
                 </div>
                 """, unsafe_allow_html=True)
                 
-                # JavaScript to scroll department edit into view
-                st.markdown("""
-                <script>
-                    (function() {
-                        function scrollToDeptForm() {
-                            const element = document.getElementById('department-edit-form-anchor');
-                            if (element) {
-                                element.scrollIntoView({behavior: 'smooth', block: 'start', inline: 'nearest'});
-                                setTimeout(function() {
-                                    element.scrollIntoView({behavior: 'smooth', block: 'start'});
-                                }, 100);
+                # JavaScript to scroll department edit into view (only on the run that opened it)
+                if st.session_state.get("just_opened_dept_edit"):
+                    st.markdown("""
+                    <script>
+                        (function() {
+                            function scrollToDeptForm() {
+                                const element = document.getElementById('department-edit-form-anchor');
+                                if (element) {
+                                    element.scrollIntoView({behavior: 'smooth', block: 'start', inline: 'nearest'});
+                                    setTimeout(function() {
+                                        element.scrollIntoView({behavior: 'smooth', block: 'start'});
+                                    }, 100);
+                                }
                             }
-                        }
                         
-                        setTimeout(scrollToDeptForm, 100);
-                        setTimeout(scrollToDeptForm, 300);
-                        setTimeout(scrollToDeptForm, 500);
-                    })();
-                </script>
-                """, unsafe_allow_html=True)
+                            setTimeout(scrollToDeptForm, 100);
+                            setTimeout(scrollToDeptForm, 300);
+                            setTimeout(scrollToDeptForm, 500);
+                        })();
+                    </script>
+                    """, unsafe_allow_html=True)
+                    st.session_state.just_opened_dept_edit = False
                 
                 with st.form("edit_dept_form", clear_on_submit=True):
                     dn = st.text_input("Department Name *", value=old_dept_name) 
@@ -1773,20 +2133,22 @@ with col2:
                     if save_dept:
                         if not dn.strip():
                             st.error("⚠️ Department name is required!")
-                        elif dn.strip().lower() != old_dept_name.lower() and dn.strip().lower() in df_dept["Department Name"].str.lower().values:
+                        elif dn.strip().lower() != old_dept_name.lower() and dn.strip().lower() in dept_names_lc_set:
                             st.error(f"⚠️ Department '{dn.strip()}' already exists!")
                             st.info("💡 Use 'Manage Departments' in sidebar to merge departments, or choose a different name")
                         else:
-                            # Explicitly convert to string to avoid dtype warnings
-                            st.session_state.df_dept.at[idx, "Department Name"] = str(dn.strip())
-                            st.session_state.df_dept.at[idx, "Description"] = str(dd.strip()) if dd.strip() else ""
+                            # Columns are already string dtype, so the stripped inputs go in as-is
+                            st.session_state.df_dept.loc[idx, ["Department Name", "Description"]] = [dn.strip(), dd.strip()]
                             
                             # Update department name in all employee records
                             if old_dept_name != dn.strip():
-                                st.session_state.df_emp.loc[st.session_state.df_emp["Department"] == old_dept_name, "Department"] = str(dn.strip())
+                                # Positional write to the rows indexed under the old name, no full-column compare
+                                refresh_employee_index()
+                                emp_rows = st.session_state.dept_positions.get(old_dept_name, [])
+                                st.session_state.df_emp.iloc[emp_rows, st.session_state.df_emp.columns.get_loc("Department")] = dn.strip()
                                 st.info(f"📝 Updated department name from '{old_dept_name}' to '{dn.strip()}' in all employee records.")
                             
-                            write_workbook(EXCEL_PATH, st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+                            save_data()
                             st.success("✅ Department updated.")
                             # Clear edit mode BEFORE rerun
                             st.session_state.edit_dept_mode = False
@@ -1796,15 +2158,17 @@ with col2:
                         
                     if del_dept:
                         dept_name = st.session_state.df_dept.at[idx, "Department Name"]
-                        emp_count = len(st.session_state.df_emp[st.session_state.df_emp["Department"] == dept_name])
+                        emp_count = st.session_state.dept_counts.get(dept_name, 0)
                         
                         if emp_count > 0:
                             st.warning(f"⚠️ This department has {emp_count} employee(s). They will be unassigned.")
                         
                         st.session_state.df_dept = st.session_state.df_dept.drop(index=idx).reset_index(drop=True)
                         # Remove department from employees (set to blank)
-                        st.session_state.df_emp.loc[st.session_state.df_emp["Department"] == dept_name, "Department"] = ""
-                        write_workbook(EXCEL_PATH, st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+                        refresh_employee_index()
+                        emp_rows = st.session_state.dept_positions.get(dept_name, [])
+                        st.session_state.df_emp.iloc[emp_rows, st.session_state.df_emp.columns.get_loc("Department")] = ""
+                        save_data()
                         st.success("🗑️ Deleted department and cleared assignments in employees.")
                         st.session_state.edit_dept_mode = False
                         st.session_state.edit_dept_idx = None
@@ -1821,31 +2185,36 @@ st.markdown("---")
 # Footer section with better styling - Admin only
 if is_admin():
     col_foot1, col_foot2, col_foot3 = st.columns(3)
+    emp_store_path = STORE_PATHS[EMP_SHEET]
     with col_foot1:
-        st.metric("📁 Data Source", "Excel Workbook")
-        st.caption(f"File: `{EXCEL_PATH}`")
+        st.metric("📁 Data Source", "Parquet Store")
+        st.caption(f"File: `{emp_store_path}` · Excel copy: `{EXCEL_PATH}`")
+    # One stat per second at most; save_data() drops the cached result so a save shows up right away
+    stat_time, store_stat = st.session_state.get('store_stat_cache', (0.0, None))
+    if time.time() - stat_time > 1:
+        store_stat = file_stat(emp_store_path)
+        st.session_state.store_stat_cache = (time.time(), store_stat)
     with col_foot2:
-        if os.path.exists(EXCEL_PATH):
-            mod_time = datetime.fromtimestamp(os.path.getmtime(EXCEL_PATH))
+        if store_stat is not None:
+            mod_time = datetime.fromtimestamp(store_stat.st_mtime)
             st.metric("🕐 Last Modified", mod_time.strftime("%Y-%m-%d %H:%M:%S"))
         else:
             st.metric("🕐 Last Modified", "N/A")
     with col_foot3:
-        file_size = os.path.getsize(EXCEL_PATH) if os.path.exists(EXCEL_PATH) else 0
+        file_size = store_stat.st_size if store_stat is not None else 0
         st.metric("📊 File Size", f"{file_size / 1024:.2f} KB")
 
     # Footer: show raw data and last saved time - Admin only
+    # Expander bodies run even when collapsed, so the tables are only built and sent once toggled on
     with st.expander("🔍 Raw Employees Data (for debugging)"):
-        # Convert to string types for display to avoid Arrow errors
-        df_emp_display = df_emp.copy()
-        df_emp_display = df_emp_display.astype(str)
-        st.dataframe(df_emp_display, use_container_width=True)
+        if st.toggle("Show table", key="show_raw_emp"):
+            # Convert to string types for display to avoid Arrow errors
+            st.dataframe(df_emp.astype(str), use_container_width=True)
 
     with st.expander("🔍 Raw Departments Data (for debugging)"):
-        # Convert to string types for display to avoid Arrow errors
-        df_dept_display = df_dept.copy()
-        df_dept_display = df_dept_display.astype(str)
-        st.dataframe(df_dept_display, use_container_width=True)
+        if st.toggle("Show table", key="show_raw_dept"):
+            # Convert to string types for display to avoid Arrow errors
+            st.dataframe(df_dept.astype(str), use_container_width=True)
 
 st.markdown("---")
 
@@ -1876,14 +2245,24 @@ if st.session_state.show_bulk_upload:
         
         if uploaded_file is not None:
             try:
-                # Read the uploaded file
-                if uploaded_file.name.endswith('.csv'):
-                    bulk_df = pd.read_csv(uploaded_file)
-                else:
-                    bulk_df = pd.read_excel(uploaded_file, engine='openpyxl')
+                # Read the uploaded file once per upload, not on every rerun of the mapping/review steps
+                if st.session_state.bulk_upload_df is None or st.session_state.get('bulk_file_id') != uploaded_file.file_id:
+                    if uploaded_file.name.endswith('.csv'):
+                        bulk_df = pd.read_csv(uploaded_file)
+                    else:
+                        bulk_df = pd.read_excel(uploaded_file, engine=EXCEL_READ_ENGINE)
+                    st.session_state.bulk_upload_df = bulk_df
+                    # Every column as trimmed text ("" for blanks), cleaned column-wise once for the preview build
+                    # (Arrow-backed, like the employee frame, so strip/isin/== run as Arrow kernels)
+                    st.session_state.bulk_text_df = pd.DataFrame(
+                        {c: bulk_df[c].astype(STRING_DTYPE).str.strip().fillna("") for c in bulk_df.columns},
+                        index=bulk_df.index,
+                    )
+                    st.session_state.bulk_file_id = uploaded_file.file_id
+                bulk_df = st.session_state.bulk_upload_df
+                bulk_text = st.session_state.bulk_text_df
                 
                 st.success(f"✅ File uploaded successfully! Found {len(bulk_df)} rows and {len(bulk_df.columns)} columns.")
-                st.session_state.bulk_upload_df = bulk_df
                 
                 # Show preview
                 st.markdown("**📋 File Preview (first 5 rows):**")
@@ -1895,6 +2274,8 @@ if st.session_state.show_bulk_upload:
                 
                 # Column mapping
                 file_columns = ["(Don't Import)"] + list(bulk_df.columns)
+                # Normalize file headers once; auto-detect matches ignoring case and spaces
+                normalized_columns = [str(c).lower().replace(" ", "") for c in file_columns]
                 system_columns = [col for col in EMP_COLUMNS if col not in ["Row ID", "Last Updated"]]
                 
                 col_map1, col_map2 = st.columns(2)
@@ -1904,11 +2285,8 @@ if st.session_state.show_bulk_upload:
                     st.markdown("**📄 Map Required Fields:**")
                     for sys_col in ["Employee ID", "Name", "Extension"]:
                         # Try to auto-detect matching column
-                        default_idx = 0
-                        for idx, file_col in enumerate(file_columns):
-                            if file_col.lower() == sys_col.lower() or file_col.lower().replace(" ", "") == sys_col.lower().replace(" ", ""):
-                                default_idx = idx
-                                break
+                        target = sys_col.lower().replace(" ", "")
+                        default_idx = next((i for i, c in enumerate(normalized_columns) if c == target), 0)
                         
                         selected = st.selectbox(
                             f"{sys_col} {'*' if sys_col in ['Name', 'Extension'] else '(Optional)'}",
@@ -1923,11 +2301,8 @@ if st.session_state.show_bulk_upload:
                     st.markdown("**📋 Map Optional Fields:**")
                     for sys_col in ["Department", "Cell Number", "Location", "Status", "Notes"]:
                         # Try to auto-detect matching column
-                        default_idx = 0
-                        for idx, file_col in enumerate(file_columns):
-                            if file_col.lower() == sys_col.lower() or file_col.lower().replace(" ", "") == sys_col.lower().replace(" ", ""):
-                                default_idx = idx
-                                break
+                        target = sys_col.lower().replace(" ", "")
+                        default_idx = next((i for i, c in enumerate(normalized_columns) if c == target), 0)
                         
                         selected = st.selectbox(
                             f"{sys_col}",
@@ -1973,25 +2348,27 @@ if st.session_state.show_bulk_upload:
                 
                 # Extract unique departments from import file
                 import_departments = set()
-                for idx, row in bulk_df.iterrows():
-                    dept_value = None
-                    if "Department" in mapping:
-                        dept_value = row[mapping["Department"]] if pd.notna(row[mapping["Department"]]) else None
-                    
-                    # Check if default department is set
-                    if "Department" in defaults:
-                        dept_value = defaults["Department"]
-                    
-                    if dept_value and str(dept_value).strip():
-                        import_departments.add(str(dept_value).strip())
+                # Mapped department values (already trimmed text) for both the unique set and the per-department counts
+                dept_values = bulk_text[mapping["Department"]] if "Department" in mapping else None
+                if "Department" in defaults:
+                    # A default department overrides the mapped column for every row
+                    if not bulk_df.empty and str(defaults["Department"]).strip():
+                        import_departments = {str(defaults["Department"]).strip()}
+                elif dept_values is not None:
+                    import_departments = set(dept_values[dept_values != ""].unique())
+                # Rows per mapped department value, for the per-department counts below
+                import_dept_counts = dept_values.value_counts().to_dict() if dept_values is not None else {}
                 
-                # Check which departments don't exist
-                existing_dept_names = set(st.session_state.df_dept["Department Name"].astype(str).str.strip().values)
+                # Check which departments don't exist (name set is rebuilt only when departments change)
+                refresh_department_index(st.session_state.df_dept)
+                existing_dept_names = st.session_state.dept_names_set
                 missing_departments = import_departments - existing_dept_names
                 
                 if missing_departments:
                     st.warning(f"⚠️ Found {len(missing_departments)} department(s) that don't exist in the system")
                     st.info("💡 Choose an action for each missing department")
+                    # Shared by every "Map to Existing" select box below
+                    map_options = [""] + sorted(existing_dept_names)
                     
                     for dept_name in sorted(missing_departments):
                         dept_key = f"dept_{dept_name}"
@@ -2022,7 +2399,7 @@ if st.session_state.show_bulk_upload:
                                 elif action == "Map to Existing":
                                     existing_dept = st.selectbox(
                                         "Select existing department:",
-                                        options=[""] + sorted(existing_dept_names),
+                                        options=map_options,
                                         key=f"{dept_key}_map"
                                     )
                                     if existing_dept:
@@ -2041,12 +2418,8 @@ if st.session_state.show_bulk_upload:
                                     st.info(f"⏭️ Will skip '{dept_name}' (employees will have no department)")
                             
                             with col_d2:
-                                # Show count of employees using this department
-                                emp_count = sum(1 for idx, row in bulk_df.iterrows() 
-                                              if "Department" in mapping and 
-                                              pd.notna(row[mapping["Department"]]) and 
-                                              str(row[mapping["Department"]]).strip() == dept_name)
-                                st.metric("Employees", emp_count)
+                                # Show count of employees using this department (precomputed by value_counts above)
+                                st.metric("Employees", import_dept_counts.get(dept_name, 0))
                     
                     st.session_state.missing_depts_handled = True
                 else:
@@ -2064,82 +2437,62 @@ if st.session_state.show_bulk_upload:
                 if not st.session_state.missing_depts_handled:
                     st.info("⏳ Please handle missing departments above before proceeding to import")
                 else:
-                    # Create preview dataframe with duplicate detection
-                    preview_data = []
-                    duplicate_records = []
-                    error_records = []
+                    # Create preview records with duplicate detection, column-wise rather than row by row
+                    # Mapped columns as trimmed text ("" for blanks), renamed to their system fields
+                    records = bulk_text[list(mapping.values())].set_axis(list(mapping), axis=1)
+                    blank = pd.Series("", index=bulk_df.index)
+                    names = records.get("Name", blank)
+                    emp_ids = records.get("Employee ID", blank)
+                    extensions = records.get("Extension", blank)
                     
-                    existing_emp_ids = set(st.session_state.df_emp["Employee ID"].astype(str).values)
-                    existing_extensions = set(st.session_state.df_emp["Extension"].astype(str).values)
+                    # Classify every row in one pass: errors first, then IDs/extensions already in the
+                    # system or repeated by an earlier valid row of the file
+                    missing_name = names.eq("")
+                    missing_ext = extensions.eq("")
+                    valid = ~(missing_name | missing_ext)
+                    def repeats(values):
+                        return values[valid].duplicated().reindex(values.index, fill_value=False)
+                    id_dup = emp_ids.ne("") & ((st.session_state.emp_id_keys.get_indexer(emp_ids) >= 0) | repeats(emp_ids))
+                    ext_dup = extensions.ne("") & ((st.session_state.extension_keys.get_indexer(extensions) >= 0) | repeats(extensions))
                     
-                    for idx, row in bulk_df.iterrows():
-                        new_emp = {
-                            "Row ID": next_row_id(st.session_state.df_emp) + len(preview_data) + len(duplicate_records),
-                            "File Row": idx + 2,  # Excel row number (1-indexed + header)
-                        }
-                        
-                        # Map columns
-                        for sys_col, file_col in mapping.items():
-                            value = row[file_col] if pd.notna(row[file_col]) else ""
-                            new_emp[sys_col] = str(value).strip()
-                        
-                        # Apply defaults (override if set)
-                        for sys_col, default_value in defaults.items():
-                            new_emp[sys_col] = default_value
-                        
-                        # Apply department mappings/skips
-                        if "Department" in new_emp:
-                            dept_name = new_emp["Department"]
-                            if dept_name in st.session_state.bulk_dept_actions:
-                                action = st.session_state.bulk_dept_actions[dept_name]
-                                if action["action"] == "map":
-                                    new_emp["Department"] = action["target"]
-                                elif action["action"] == "skip":
-                                    new_emp["Department"] = ""
-                                # If "create", keep the department name as-is
-                        
-                        # Fill missing required columns
-                        for col in EMP_COLUMNS:
-                            if col not in new_emp:
-                                if col == "Last Updated":
-                                    new_emp[col] = datetime.utcnow().isoformat()
-                                else:
-                                    new_emp[col] = ""
-                        
-                        # Validate
-                        row_errors = []
-                        if not new_emp.get("Name", "").strip():
-                            row_errors.append("Missing Name")
-                        if not new_emp.get("Extension", "").strip():
-                            row_errors.append("Missing Extension")
-                        
-                        # Check for duplicates
-                        emp_id = new_emp.get("Employee ID", "").strip()
-                        extension = new_emp.get("Extension", "").strip()
-                        
-                        duplicate_issues = []
-                        if emp_id and emp_id in existing_emp_ids:
-                            duplicate_issues.append(f"Employee ID '{emp_id}' exists")
-                        if extension and extension in existing_extensions:
-                            duplicate_issues.append(f"Extension '{extension}' exists")
-                        
-                        if row_errors:
-                            new_emp["Errors"] = ", ".join(row_errors)
-                            error_records.append(new_emp)
-                        elif duplicate_issues:
-                            new_emp["Duplicate Issues"] = duplicate_issues
-                            duplicate_records.append(new_emp)
-                            # Initialize selection state for this record
-                            record_key = f"row_{new_emp['File Row']}"
-                            if record_key not in st.session_state.bulk_selections:
-                                st.session_state.bulk_selections[record_key] = {"import": False, "replace": False}
-                        else:
-                            preview_data.append(new_emp)
-                            # Add to tracking sets
-                            if emp_id:
-                                existing_emp_ids.add(emp_id)
-                            if extension:
-                                existing_extensions.add(extension)
+                    # Row IDs continue after the highest existing one, counting only importable (non-error) rows
+                    is_error = ~valid
+                    importable = valid.astype(int)
+                    records.insert(0, "File Row", bulk_df.index + 2)  # Excel row number (1-indexed + header)
+                    records.insert(0, "Row ID", next_row_id(st.session_state.df_emp) + importable.cumsum() - importable)
+                    
+                    # Defaults override mapped values, then department actions apply
+                    for sys_col, default_value in defaults.items():
+                        records[sys_col] = default_value
+                    if "Department" in records:
+                        dept_remap = {
+                            name: action["target"] if action["action"] == "map" else ""
+                            for name, action in st.session_state.bulk_dept_actions.items()
+                            if action["action"] in ("map", "skip")
+                        }  # "create" keeps the department name as-is
+                        if dept_remap:
+                            records["Department"] = records["Department"].replace(dept_remap)
+                    
+                    # Fill missing required columns in one column alignment
+                    records = records.reindex(columns=[*records.columns, *(c for c in EMP_COLUMNS if c not in records)], fill_value="")
+                    records["Last Updated"] = utc_now_iso()
+                    
+                    is_dup = valid & (id_dup | ext_dup)
+                    error_df = records[is_error].copy()
+                    error_df["Errors"] = np.where(
+                        missing_name[is_error] & missing_ext[is_error], "Missing Name, Missing Extension",
+                        np.where(missing_name[is_error], "Missing Name", "Missing Extension"),
+                    )
+                    error_records = error_df.to_dict(orient="records")
+                    duplicate_records = records[is_dup].to_dict(orient="records")
+                    for dup_emp, dup_id, dup_ext in zip(duplicate_records, id_dup[is_dup], ext_dup[is_dup]):
+                        dup_emp["Duplicate Issues"] = (
+                            ([f"Employee ID '{dup_emp['Employee ID']}' exists"] if dup_id else [])
+                            + ([f"Extension '{dup_emp['Extension']}' exists"] if dup_ext else [])
+                        )
+                        # Initialize selection state for this record
+                        st.session_state.bulk_selections.setdefault(f"row_{dup_emp['File Row']}", {"import": False, "replace": False})
+                    preview_data = records[valid & ~is_dup].to_dict(orient="records")
                     
                     # Show clean records
                     if preview_data:
@@ -2151,9 +2504,31 @@ if st.session_state.show_bulk_upload:
                     if duplicate_records:
                         st.markdown(f"**⚠️ {len(duplicate_records)} Records with Duplicates:**")
                         st.info("💡 Check the boxes to choose how to handle each duplicate record")
+                        
+                        # Only one page of expanders is built per rerun (their bodies run even when collapsed)
+                        dup_page_size = 25
+                        dup_pages = max(1, (len(duplicate_records) + dup_page_size - 1) // dup_page_size)
+                        dup_page = min(max(st.session_state.get('bulk_dup_page', 0), 0), dup_pages - 1)
+                        st.session_state.bulk_dup_page = dup_page
+                        if dup_pages > 1:
+                            col_dp1, col_dp2, col_dp3 = st.columns([1, 2, 1])
+                            with col_dp1:
+                                if st.button("⬅️ Prev", disabled=dup_page == 0, key="dup_prev"):
+                                    st.session_state.bulk_dup_page = dup_page - 1
+                                    st.rerun()
+                            with col_dp2:
+                                st.write(f"Duplicates page {dup_page + 1} of {dup_pages}")
+                            with col_dp3:
+                                if st.button("Next ➡️", disabled=dup_page >= dup_pages - 1, key="dup_next"):
+                                    st.session_state.bulk_dup_page = dup_page + 1
+                                    st.rerun()
+                        
+                        # Row positions per Employee ID / Extension, grouped on first use so each conflict lookup is a dict hit
+                        df_existing = st.session_state.df_emp
+                        id_positions = ext_positions = None
                     
                         # Create scrollable container
-                        for dup_emp in duplicate_records:
+                        for dup_emp in duplicate_records[dup_page * dup_page_size:(dup_page + 1) * dup_page_size]:
                             record_key = f"row_{dup_emp['File Row']}"
                             
                             with st.expander(f"Row {dup_emp['File Row']}: {dup_emp['Name']} - Issues: {', '.join(dup_emp['Duplicate Issues'])}", expanded=False):
@@ -2168,36 +2543,40 @@ if st.session_state.show_bulk_upload:
                                     st.write(f"- **Location:** {dup_emp.get('Location', 'N/A')}")
                                     st.write(f"- **Status:** {dup_emp.get('Status', 'N/A')}")
                                     
-                                    # Show existing conflicting records
-                                    st.markdown("**🔍 Existing Conflicting Record(s):**")
-                                    emp_id = dup_emp.get('Employee ID', '').strip()
-                                    extension = dup_emp.get('Extension', '').strip()
-                                    
-                                    conflicts = st.session_state.df_emp[
-                                        (st.session_state.df_emp['Employee ID'].astype(str) == emp_id) | 
-                                        (st.session_state.df_emp['Extension'].astype(str) == extension)
-                                    ]
-                                    if not conflicts.empty:
-                                        st.dataframe(conflicts[["Employee ID", "Name", "Extension", "Department", "Status"]], use_container_width=True)
+                                    # Show existing conflicting records (looked up and sent only when asked for)
+                                    if st.toggle("🔍 Show existing conflicting record(s)", key=f"{record_key}_conflicts"):
+                                        emp_id = dup_emp.get('Employee ID', '').strip()
+                                        extension = dup_emp.get('Extension', '').strip()
+                                        if id_positions is None:
+                                            id_positions = df_existing.groupby("Employee ID").indices
+                                            ext_positions = df_existing.groupby("Extension").indices
+                                        
+                                        positions = set(id_positions.get(emp_id, ()) if emp_id else ())
+                                        positions.update(ext_positions.get(extension, ()) if extension else ())
+                                        if positions:
+                                            conflicts = df_existing.iloc[sorted(positions)]
+                                            st.dataframe(conflicts[["Employee ID", "Name", "Extension", "Department", "Status"]], use_container_width=True)
                                 
                                 with col_dup2:
                                     st.markdown("**🎯 Action:**")
+                                    # The record's selection dict, bound once; updates below mutate it in place
+                                    sel = st.session_state.bulk_selections[record_key]
                                     
                                     import_check = st.checkbox(
                                         "✅ Import as New",
-                                        value=st.session_state.bulk_selections[record_key]["import"],
+                                        value=sel["import"],
                                         key=f"{record_key}_import",
                                         help="Import this record with a new Row ID (duplicate IDs will be kept)"
                                     )
-                                    st.session_state.bulk_selections[record_key]["import"] = import_check
+                                    sel["import"] = import_check
                                     
                                     replace_check = st.checkbox(
                                         "🔄 Replace Existing",
-                                        value=st.session_state.bulk_selections[record_key]["replace"],
+                                        value=sel["replace"],
                                         key=f"{record_key}_replace",
                                         help="Find and update the existing record with this data"
                                     )
-                                    st.session_state.bulk_selections[record_key]["replace"] = replace_check
+                                    sel["replace"] = replace_check
                                     
                                     if import_check and replace_check:
                                         st.warning("⚠️ Select only one action!")
@@ -2214,8 +2593,11 @@ if st.session_state.show_bulk_upload:
                             st.warning(f"... and {len(error_records) - 5} more error records")
                     
                     # Calculate totals
-                    selected_duplicates = sum(1 for key, val in st.session_state.bulk_selections.items() 
-                                             if val["import"] != val["replace"] and (val["import"] or val["replace"]))
+                    # A duplicate counts when exactly one action is ticked (XOR); only this upload's records are counted
+                    sels = st.session_state.bulk_selections
+                    selected_duplicates = sum(
+                        sel["import"] ^ sel["replace"] for sel in (sels[f"row_{d['File Row']}"] for d in duplicate_records)
+                    )
                     total_to_import = len(preview_data) + selected_duplicates
                     
                     st.markdown("---")
@@ -2239,26 +2621,29 @@ if st.session_state.show_bulk_upload:
                             imported_count = 0
                             replaced_count = 0
                             created_depts = []
+                            now_iso = utc_now_iso()
                             
-                            # First, create new departments based on bulk_dept_actions
+                            # First, create new departments based on bulk_dept_actions (collected, then one concat)
+                            existing_names = set(st.session_state.df_dept["Department Name"])
+                            first_dept_id = int(next_dept_id(st.session_state.df_dept))
+                            new_depts = []
                             for dept_name, action in st.session_state.bulk_dept_actions.items():
                                 if action["action"] == "create":
                                     # Check if department already exists (shouldn't, but safety check)
-                                    if dept_name not in st.session_state.df_dept["Department Name"].values:
-                                        did = next_dept_id(st.session_state.df_dept)
-                                        new_dept = {
-                                            "Dept ID": did,
+                                    if dept_name not in existing_names:
+                                        new_depts.append({
+                                            "Dept ID": str(first_dept_id + len(new_depts)),
                                             "Department Name": dept_name,
                                             "Description": action.get("description", "")
-                                        }
-                                        st.session_state.df_dept = pd.concat([st.session_state.df_dept, pd.DataFrame([new_dept])], ignore_index=True)
+                                        })
                                         created_depts.append(dept_name)
+                                        existing_names.add(dept_name)
+                            if new_depts:
+                                st.session_state.df_dept = pd.concat([st.session_state.df_dept, pd.DataFrame(new_depts, columns=DEPT_COLUMNS)], ignore_index=True)
                             
-                            # Import clean records
-                            for emp in preview_data:
-                                emp_copy = {k: v for k, v in emp.items() if k in EMP_COLUMNS}
-                                st.session_state.df_emp = pd.concat([st.session_state.df_emp, pd.DataFrame([emp_copy])], ignore_index=True)
-                                imported_count += 1
+                            # Import clean records (collected and appended in one concat below)
+                            new_rows = [{k: v for k, v in emp.items() if k in EMP_COLUMNS} for emp in preview_data]
+                            imported_count += len(new_rows)
                             
                             # Handle duplicate records based on selection
                             for dup_emp in duplicate_records:
@@ -2267,8 +2652,7 @@ if st.session_state.show_bulk_upload:
                                 
                                 if selection.get("import") and not selection.get("replace"):
                                     # Import as new record
-                                    emp_copy = {k: v for k, v in dup_emp.items() if k in EMP_COLUMNS}
-                                    st.session_state.df_emp = pd.concat([st.session_state.df_emp, pd.DataFrame([emp_copy])], ignore_index=True)
+                                    new_rows.append({k: v for k, v in dup_emp.items() if k in EMP_COLUMNS})
                                     imported_count += 1
                                 
                                 elif selection.get("replace") and not selection.get("import"):
@@ -2276,31 +2660,33 @@ if st.session_state.show_bulk_upload:
                                     emp_id = dup_emp.get('Employee ID', '').strip()
                                     extension = dup_emp.get('Extension', '').strip()
                                     
-                                    # Find existing record by Employee ID first, then Extension
-                                    if emp_id:
-                                        existing_idx = st.session_state.df_emp[st.session_state.df_emp['Employee ID'].astype(str) == emp_id].index
-                                    elif extension:
-                                        existing_idx = st.session_state.df_emp[st.session_state.df_emp['Extension'].astype(str) == extension].index
-                                    else:
-                                        existing_idx = []
+                                    # Find existing record by Employee ID first, then Extension (O(1) lookups, no column scans)
+                                    idx = st.session_state.emp_id_index.get(emp_id) if emp_id else None
+                                    if idx is None and extension:
+                                        idx = st.session_state.extension_index.get(extension)
                                     
-                                    if len(existing_idx) > 0:
-                                        idx = existing_idx[0]
-                                        # Update all fields except Row ID
-                                        for col in EMP_COLUMNS:
-                                            if col != "Row ID" and col in dup_emp:
-                                                st.session_state.df_emp.at[idx, col] = str(dup_emp[col])
-                                        st.session_state.df_emp.at[idx, "Last Updated"] = datetime.utcnow().isoformat()
+                                    if idx is not None:
+                                        # Update all fields except Row ID in one row assignment
+                                        updates = {col: str(dup_emp[col]) for col in EMP_TEXT_COLUMNS if col in dup_emp}
+                                        updates["Last Updated"] = now_iso
+                                        st.session_state.df_emp.loc[idx, list(updates)] = list(updates.values())
                                         replaced_count += 1
                             
+                            if new_rows:
+                                # Stamped as a whole column at import time (the preview rows carry the time they were previewed)
+                                new_df = pd.DataFrame(new_rows, columns=EMP_COLUMNS)
+                                new_df["Last Updated"] = now_iso
+                                st.session_state.df_emp = pd.concat([st.session_state.df_emp, new_df], ignore_index=True)
+                            
                             # Save to Excel
-                            write_workbook(EXCEL_PATH, st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+                            save_data()
                             
                             # Show success message with details
                             success_msg = f"🎉 Successfully imported {imported_count} new records and updated {replaced_count} existing records!"
                             if created_depts:
                                 success_msg += f"\n\n🏢 Created {len(created_depts)} new department(s): {', '.join(created_depts)}"
-                            st.success(success_msg)
+                            # Shown as a toast after the rerun instead of blocking this one in a sleep
+                            st.session_state.flash_message = success_msg
                             
                             # Reset state
                             st.session_state.show_bulk_upload = False
@@ -2308,18 +2694,16 @@ if st.session_state.show_bulk_upload:
                             st.session_state.bulk_mapping = {}
                             st.session_state.bulk_defaults = {}
                             st.session_state.bulk_selections = {}
+                            st.session_state.bulk_dup_page = 0
                             st.session_state.bulk_dept_actions = {}
                             st.session_state.missing_depts_handled = False
-                            time.sleep(1.5)
                             st.rerun()
                     
                     with col_imp2:
                         if st.button("📋 Download Template", use_container_width=True):
-                            template_df = pd.DataFrame(columns=["Employee ID", "Name", "Extension", "Department", "Cell Number", "Location", "Status", "Notes"])
-                            template_df.loc[0] = ["EMP001", "John Doe", "1234", "IT", "+1234567890", "New York", "Active", "Sample employee"]
                             st.download_button(
                                 "⬇️ Download Excel Template",
-                                data=template_df.to_csv(index=False).encode('utf-8'),
+                                data=import_template_bytes(),
                                 file_name="employee_import_template.csv",
                                 mime="text/csv"
                             )
@@ -2389,13 +2773,17 @@ if st.session_state.show_dept_sync:
     
     # Find departments in employees that don't exist in departments table
     # Always read from the persisted workbook to get true state
-    _sync_emp, _sync_dept,_sync_users = read_workbook(EXCEL_PATH)
+    _sync_emp, _sync_dept,_sync_users = load_data()
+    sync_dept_counts = department_counts(_sync_emp)
+    # Row positions per department from one hashed groupby; each "View Employees" list is a positional take
+    sync_dept_rows = _sync_emp.groupby("Department", sort=False).indices
     
-    emp_depts = set(_sync_emp["Department"].dropna().astype(str).str.strip().values)
+    emp_depts = set(_sync_emp["Department"].unique())
     emp_depts = {d for d in emp_depts if d and d != 'nan' and d != ''}
     
-    existing_depts = set(_sync_dept["Department Name"].dropna().astype(str).str.strip().values)
+    existing_depts = set(_sync_dept["Department Name"])
     existing_depts = {d for d in existing_depts if d and d != 'nan' and d != ''}
+    existing_depts_lc = {d.lower() for d in existing_depts}  # hashed case-insensitive name checks
     
     missing_depts = emp_depts - existing_depts
     
@@ -2441,8 +2829,7 @@ if st.session_state.show_dept_sync:
                                 
                                 # Check if new name already exists in existing departments
                                 if rename and new_name and new_name.strip():
-                                    existing_names_lower = [n.lower() for n in existing_depts if n]
-                                    if new_name.strip().lower() in existing_names_lower:
+                                    if new_name.strip().lower() in existing_depts_lc:
                                         st.error(f"⚠️ Department '{new_name.strip()}' already exists!")
                                         st.info("💡 Options: Use 'Map to Existing Department' to merge with existing, or choose a different name")
                                         new_name = None  # Block creation
@@ -2520,16 +2907,14 @@ if st.session_state.show_dept_sync:
                                 st.warning(f"⚠️ Will remove department from employee records (set to blank)")
                         
                         with col_d2:
-                            # Show affected employees from persisted data
-                            affected_emps = _sync_emp[
-                                _sync_emp["Department"].astype(str).str.strip() == dept_name
-                            ]
-                            st.metric("Affected Employees", len(affected_emps))
+                            # Show affected employees from persisted data (count from the value_counts above)
+                            affected_count = sync_dept_counts.get(dept_name, 0)
+                            st.metric("Affected Employees", affected_count)
                             
-                            if len(affected_emps) > 0:
+                            if affected_count > 0:
                                 with st.expander("👥 View Employees"):
-                                    for _, emp in affected_emps.iterrows():
-                                        st.write(f"• {emp['Name']} ({emp.get('Employee ID', 'N/A')})")
+                                    affected_emps = _sync_emp.iloc[sync_dept_rows.get(dept_name, [])]
+                                    st.markdown("  \n".join(f"• {n} ({i})" for n, i in zip(affected_emps["Name"], affected_emps["Employee ID"])))
         
         with col_sync2:
             st.markdown("### 📖 Quick Guide")
@@ -2551,30 +2936,39 @@ if st.session_state.show_dept_sync:
         with col_btn1:
             if st.button("✅ Apply Changes", use_container_width=True, type="primary", key="apply_sync_btn"):
                 # Check if all departments have valid actions
-                incomplete = []
-                for dept_name in missing_depts:
-                    if dept_name not in st.session_state.sync_dept_actions:
-                        incomplete.append(dept_name)
-                    elif st.session_state.sync_dept_actions[dept_name]["action"] == "map":
-                        if "target" not in st.session_state.sync_dept_actions[dept_name]:
-                            incomplete.append(dept_name)
+                # No action chosen yet, or a map without a target
+                actions = st.session_state.sync_dept_actions
+                incomplete = [
+                    d for d in missing_depts
+                    if d not in actions or (actions[d]["action"] == "map" and "target" not in actions[d])
+                ]
                 
                 if incomplete:
                     st.error(f"⚠️ Please complete actions for: {', '.join(incomplete)}")
                 else:
                     created_count = 0
-                    mapped_count = 0
-                    removed_count = 0
                     merged_count = 0
                     renamed_count = 0
+                    now_iso = utc_now_iso()
                     
                     # Track merged departments to avoid duplicate processing
                     processed_merges = set()
+                    # Old name -> new name for every employee row the actions touch, applied in one pass below.
+                    # Every (old, new) claim is also listed, including names a department keeps, so
+                    # actions that disagree about a department are caught before anything is applied
+                    rename_map = {}
+                    rename_claims = []
+                    mapped_names, removed_names = [], []
+                    # Dept IDs for created departments count up from here (one max() scan, not one per department)
+                    next_did = int(next_dept_id(st.session_state.df_dept))
+                    # Created departments are collected here and appended in one concat after the loop
+                    new_depts = []
                     
                     for dept_name, action in st.session_state.sync_dept_actions.items():
                         if action["action"] == "create":
                             # Create new department (with optional rename)
-                            did = next_dept_id(st.session_state.df_dept)
+                            did = str(next_did)
+                            next_did += 1
                             final_name = action.get("new_name", dept_name)
                             
                             new_dept = {
@@ -2582,13 +2976,12 @@ if st.session_state.show_dept_sync:
                                 "Department Name": final_name,
                                 "Description": action.get("description", "Synced from employee records")
                             }
-                            st.session_state.df_dept = pd.concat([st.session_state.df_dept, pd.DataFrame([new_dept])], ignore_index=True)
+                            new_depts.append(new_dept)
                             
                             # Update employee records if renamed
+                            rename_claims.append((dept_name, final_name))
                             if final_name != dept_name:
-                                mask = st.session_state.df_emp["Department"].astype(str).str.strip() == dept_name
-                                st.session_state.df_emp.loc[mask, "Department"] = final_name
-                                st.session_state.df_emp.loc[mask, "Last Updated"] = datetime.utcnow().isoformat()
+                                rename_map[dept_name] = final_name
                                 renamed_count += 1
                             
                             created_count += 1
@@ -2603,63 +2996,67 @@ if st.session_state.show_dept_sync:
                             
                             if merge_key not in processed_merges:
                                 # Create the merged department
-                                did = next_dept_id(st.session_state.df_dept)
+                                did = str(next_did)
+                                next_did += 1
                                 new_dept = {
                                     "Dept ID": did,
                                     "Department Name": merged_name,
                                     "Description": f"Merged from: {dept_name}, {merge_target}"
                                 }
-                                st.session_state.df_dept = pd.concat([st.session_state.df_dept, pd.DataFrame([new_dept])], ignore_index=True)
+                                new_depts.append(new_dept)
                                 
                                 # Update employee records for both departments
-                                mask1 = st.session_state.df_emp["Department"].astype(str).str.strip() == dept_name
-                                mask2 = st.session_state.df_emp["Department"].astype(str).str.strip() == merge_target
-                                combined_mask = mask1 | mask2
-                                
-                                st.session_state.df_emp.loc[combined_mask, "Department"] = merged_name
-                                st.session_state.df_emp.loc[combined_mask, "Last Updated"] = datetime.utcnow().isoformat()
+                                rename_map[dept_name] = rename_map[merge_target] = merged_name
+                                rename_claims += [(dept_name, merged_name), (merge_target, merged_name)]
                                 
                                 merged_count += 1
                                 processed_merges.add(merge_key)
                         
                         elif action["action"] == "map":
                             # Update employee records to use existing department
-                            target = action["target"]
-                            mask = st.session_state.df_emp["Department"].astype(str).str.strip() == dept_name
-                            st.session_state.df_emp.loc[mask, "Department"] = target
-                            st.session_state.df_emp.loc[mask, "Last Updated"] = datetime.utcnow().isoformat()
-                            mapped_count += len(st.session_state.df_emp[mask])
+                            rename_map[dept_name] = action["target"]
+                            rename_claims.append((dept_name, action["target"]))
+                            mapped_names.append(dept_name)
                         
                         elif action["action"] == "remove":
                             # Remove department from employee records
-                            mask = st.session_state.df_emp["Department"].astype(str).str.strip() == dept_name
-                            st.session_state.df_emp.loc[mask, "Department"] = ""
-                            st.session_state.df_emp.loc[mask, "Last Updated"] = datetime.utcnow().isoformat()
-                            removed_count += len(st.session_state.df_emp[mask])
+                            rename_map[dept_name] = ""
+                            rename_claims.append((dept_name, ""))
+                            removed_names.append(dept_name)
                     
-                    # Save changes
-                    write_workbook(EXCEL_PATH, st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+                    conflicts = department_rename_conflicts(rename_claims)
+                    if conflicts:
+                        st.error(f"⚠️ These departments are changed by more than one action: {', '.join(conflicts)}. Apply those changes in separate steps.")
+                    else:
+                        if new_depts:
+                            st.session_state.df_dept = pd.concat([st.session_state.df_dept, pd.DataFrame(new_depts, columns=DEPT_COLUMNS)], ignore_index=True)
+                        moved = apply_department_renames(st.session_state.df_emp, rename_map, now_iso)
+                        mapped_count = int(moved.reindex(mapped_names, fill_value=0).sum())
+                        removed_count = int(moved.reindex(removed_names, fill_value=0).sum())
                     
-                    # Show success message
-                    success_msg = "🎉 Sync completed!\n\n"
-                    if created_count > 0:
-                        success_msg += f"✅ Created {created_count} new department(s)\n"
-                    if merged_count > 0:
-                        success_msg += f"🔀 Merged {merged_count} department pair(s) into one\n"
-                    if renamed_count > 0:
-                        success_msg += f"✏️ Renamed {renamed_count} department(s)\n"
-                    if mapped_count > 0:
-                        success_msg += f"🔄 Updated {mapped_count} employee record(s) with mapped departments\n"
-                    if removed_count > 0:
-                        success_msg += f"🗑️ Removed department from {removed_count} employee record(s)\n"
+                        # Save changes
+                        save_data()
                     
-                    st.success(success_msg)
+                        # Show success message
+                        success_msg = "🎉 Sync completed!\n\n"
+                        if created_count > 0:
+                            success_msg += f"✅ Created {created_count} new department(s)\n"
+                        if merged_count > 0:
+                            success_msg += f"🔀 Merged {merged_count} department pair(s) into one\n"
+                        if renamed_count > 0:
+                            success_msg += f"✏️ Renamed {renamed_count} department(s)\n"
+                        if mapped_count > 0:
+                            success_msg += f"🔄 Updated {mapped_count} employee record(s) with mapped departments\n"
+                        if removed_count > 0:
+                            success_msg += f"🗑️ Removed department from {removed_count} employee record(s)\n"
                     
-                    # Reset state
-                    st.session_state.show_dept_sync = False
-                    st.session_state.sync_dept_actions = {}
-                    time.sleep(2)
-                    st.rerun()
+                        # Shown as a toast after the rerun instead of blocking this one in a sleep
+                        st.session_state.flash_message = success_msg
+                    
+                        # Reset state
+                        st.session_state.show_dept_sync = False
+                        st.session_state.sync_dept_actions = {}
+                        st.rerun()
         
         with col_btn2:
             if st.button("🔄 Select All → Create New", use_container_width=True, help="Quick action: Create all missing departments"):
@@ -2683,9 +3080,8 @@ if st.session_state.show_dept_sync:
         if emp_depts:
             st.info(f"📋 Found {len(emp_depts)} department(s) in employee records - all exist in the department list")
             with st.expander("View synced departments"):
-                for dept in sorted(emp_depts):
-                    emp_count = len(_sync_emp[_sync_emp["Department"].astype(str).str.strip() == dept])
-                    st.write(f"✅ **{dept}** - {emp_count} employee(s)")
+                # Expander bodies run even when collapsed, so the list goes out as one markdown block, not an element per department
+                st.markdown("  \n".join(f"✅ **{dept}** - {sync_dept_counts.get(dept, 0)} employee(s)" for dept in sorted(emp_depts)))
         else:
             st.info("No departments assigned to any employees yet")
         
@@ -2710,8 +3106,16 @@ if st.session_state.show_dept_manage:
     </div>
     """, unsafe_allow_html=True)
     
-    # Read current departments from persisted file
-    _manage_emp, _manage_dept, _manage_users = read_workbook(EXCEL_PATH)
+    # Read current departments from persisted store
+    _manage_emp, _manage_dept, _manage_users = load_data()
+    manage_dept_counts = department_counts(_manage_emp)
+    manage_dept_rows = _manage_emp.groupby("Department", sort=False).indices  # positions for every "View" list
+    manage_names_lower = _manage_dept["Department Name"].astype(STRING_DTYPE).str.lower()
+    manage_names_lc = set(manage_names_lower)  # hashed case-insensitive name checks
+    # Department Name -> Dept ID of its first row, for merge targets (reversed so the first occurrence wins)
+    manage_id_by_name = dict(zip(_manage_dept["Department Name"][::-1], _manage_dept["Dept ID"][::-1]))
+    # (name, Dept ID) pairs sorted once; each merge list just leaves out its own department
+    manage_sorted_depts = sorted(zip(_manage_dept["Department Name"], _manage_dept["Dept ID"]))
     
     if len(_manage_dept) == 0:
         st.info("No departments found in the department list")
@@ -2721,37 +3125,68 @@ if st.session_state.show_dept_manage:
         
         # Filter departments based on search
         if search_dept:
-            filtered_dept = _manage_dept[_manage_dept["Department Name"].astype(str).str.contains(search_dept, case=False, na=False)]
+            filtered_dept = _manage_dept[contains_lc(manage_names_lower, search_dept)]
         else:
             filtered_dept = _manage_dept
         
         st.info(f"📋 Showing {len(filtered_dept)} of {len(_manage_dept)} department(s)")
         
+        # Only one page of expanders is built per rerun (their bodies run even when collapsed)
+        manage_page_size = 50
+        manage_pages = max(1, (len(filtered_dept) + manage_page_size - 1) // manage_page_size)
+        manage_page = min(max(st.session_state.get('dept_manage_page', 0), 0), manage_pages - 1)
+        st.session_state.dept_manage_page = manage_page
+        
         # Use a scrollable container to avoid long pages
         st.markdown(f"### 📋 Department List")
+        if manage_pages > 1:
+            col_mp1, col_mp2, col_mp3 = st.columns([1, 2, 1])
+            with col_mp1:
+                if st.button("⬅️ Prev", disabled=manage_page == 0, key="manage_prev"):
+                    st.session_state.dept_manage_page = manage_page - 1
+                    st.rerun()
+            with col_mp2:
+                st.write(f"Departments page {manage_page + 1} of {manage_pages}")
+            with col_mp3:
+                if st.button("Next ➡️", disabled=manage_page >= manage_pages - 1, key="manage_next"):
+                    st.session_state.dept_manage_page = manage_page + 1
+                    st.rerun()
         with st.container(height=600):
             if len(filtered_dept) == 0:
                 st.warning("No departments found matching your search")
             else:
-                for _, dept_row in filtered_dept.iterrows():
+                for _, dept_row in filtered_dept.iloc[manage_page * manage_page_size:(manage_page + 1) * manage_page_size].iterrows():
                     dept_id = dept_row["Dept ID"]
-                    dept_name = str(dept_row["Department Name"]).strip()
+                    dept_name = dept_row["Department Name"]
                     dept_desc = str(dept_row.get("Description", "")).strip()
                     dept_key = f"manage_dept_{dept_id}"
+                    # Widgets coming back onto the page start from the pending action, so paging doesn't drop it
+                    pending = st.session_state.dept_manage_actions.get(dept_id, {})
                     
                     # Count employees using this department
-                    emp_count = len(_manage_emp[_manage_emp["Department"].astype(str).str.strip() == dept_name])
+                    emp_count = manage_dept_counts.get(dept_name, 0)
                     
                     with st.expander(f"🏢 **{dept_name}** ({emp_count} employee(s))", expanded=False):
                         col_m1, col_m2 = st.columns([3, 1])
                         
                         with col_m1:
-                            action = st.radio(
-                                f"Action for '{dept_name}':",
-                                options=["No Change", "Rename Department", "Merge with Another Department", "Delete Department"],
-                                key=f"{dept_key}_action",
-                                help="Choose how to modify this department"
-                            )
+                            # Expander bodies run even when collapsed, so only the department being configured
+                            # (or one with a pending action) builds its action widgets; the rest get a single button
+                            if pending or st.session_state.get('manage_active_dept') == dept_id:
+                                action = st.radio(
+                                    f"Action for '{dept_name}':",
+                                    options=MANAGE_DEPT_ACTIONS,
+                                    index=MANAGE_ACTION_INDEX.get(pending.get("action"), 0),
+                                    key=f"{dept_key}_action",
+                                    help="Choose how to modify this department"
+                                )
+                            else:
+                                st.button(
+                                    "⚙️ Configure",
+                                    key=f"{dept_key}_open",
+                                    on_click=lambda d=dept_id: st.session_state.update(manage_active_dept=d),
+                                )
+                                action = None
                             
                             if action == "No Change":
                                 if dept_id in st.session_state.dept_manage_actions:
@@ -2760,25 +3195,21 @@ if st.session_state.show_dept_manage:
                             elif action == "Rename Department":
                                 new_name = st.text_input(
                                     "New department name:",
-                                    value=dept_name,
+                                    value=pending.get("new_name", dept_name),
                                     key=f"{dept_key}_newname",
                                     help="Enter the new name for this department"
                                 )
                                 new_desc = st.text_input(
                                     "Update description (optional):",
-                                    value=dept_desc if dept_desc != 'nan' else "",
+                                    value=pending.get("new_desc", dept_desc if dept_desc != 'nan' else ""),
                                     key=f"{dept_key}_newdesc",
                                     placeholder="Enter description..."
                                 )
                                 
                                 if new_name and new_name.strip() != dept_name:
                                     # Check if new name already exists (excluding current department)
-                                    existing_names_lower = [
-                                        n.lower() for n in _manage_dept["Department Name"].tolist() 
-                                        if n and n.strip().lower() != dept_name.lower()
-                                    ]
-                                    
-                                    if new_name.strip().lower() in existing_names_lower:
+                                    new_name_lc = new_name.strip().lower()
+                                    if new_name_lc != dept_name.lower() and new_name_lc in manage_names_lc:
                                         st.error(f"⚠️ Department '{new_name.strip()}' already exists!")
                                         st.info("💡 Options: Use 'Merge with Another Department' to combine them, or choose a different name")
                                     else:
@@ -2796,26 +3227,31 @@ if st.session_state.show_dept_manage:
                             
                             elif action == "Merge with Another Department":
                                 # Get other departments (excluding current one)
-                                other_depts = _manage_dept[_manage_dept["Dept ID"] != dept_id]["Department Name"].tolist()
+                                other_depts = [n for n, i in manage_sorted_depts if i != dept_id]
                                 
                                 if not other_depts:
                                     st.warning("⚠️ No other departments available to merge with")
                                 else:
+                                    merge_options = [""] + other_depts
+                                    pending_target = pending.get("dept2_name", "")
                                     merge_target = st.selectbox(
                                         "Select department to merge with:",
-                                        options=[""] + sorted([str(d).strip() for d in other_depts]),
+                                        options=merge_options,
+                                        index=merge_options.index(pending_target) if pending_target in merge_options else 0,
                                         key=f"{dept_key}_merge_target",
                                         help="Both departments will be combined"
                                     )
                                     
                                     if merge_target:
                                         # Get the target department ID for later processing
-                                        target_dept_id = _manage_dept[_manage_dept["Department Name"].astype(str).str.strip() == merge_target]["Dept ID"].iloc[0]
+                                        target_dept_id = manage_id_by_name[merge_target]
                                         
                                         # Ask which name to keep or use custom
+                                        pending_final = pending.get("final_name")
                                         merge_mode = st.radio(
                                             "Choose final department name:",
                                             options=[f"Keep '{dept_name}'", f"Keep '{merge_target}'", "Use custom name"],
+                                            index=0 if pending_final in (None, dept_name) else 1 if pending_final == merge_target else 2,
                                             key=f"{dept_key}_merge_mode"
                                         )
                                         
@@ -2828,14 +3264,14 @@ if st.session_state.show_dept_manage:
                                         else:  # Use custom name
                                             final_name = st.text_input(
                                                 "Enter new department name:",
-                                                value=dept_name,
+                                                value=pending_final or dept_name,
                                                 key=f"{dept_key}_merge_custom",
                                                 help="Enter the final name for the merged department"
                                             )
                                             delete_id = target_dept_id  # Delete target, rename current
                                         
                                         if final_name and final_name.strip():
-                                            target_emp_count = len(_manage_emp[_manage_emp["Department"].astype(str).str.strip() == merge_target])
+                                            target_emp_count = manage_dept_counts.get(merge_target, 0)
                                             
                                             st.session_state.dept_manage_actions[dept_id] = {
                                                 "action": "merge_two",
@@ -2858,7 +3294,7 @@ if st.session_state.show_dept_manage:
                                     st.error(f"⚠️ Cannot delete: {emp_count} employee(s) are assigned to this department")
                                     st.info("💡 Either merge with another department or reassign employees first")
                                 else:
-                                    confirm = st.checkbox(f"Confirm deletion of '{dept_name}'", key=f"{dept_key}_delete_confirm")
+                                    confirm = st.checkbox(f"Confirm deletion of '{dept_name}'", value=pending.get("action") == "delete", key=f"{dept_key}_delete_confirm")
                                     if confirm:
                                         st.session_state.dept_manage_actions[dept_id] = {
                                             "action": "delete",
@@ -2872,9 +3308,8 @@ if st.session_state.show_dept_manage:
                             
                             if emp_count > 0:
                                 with st.expander("👥 View"):
-                                    affected_emps = _manage_emp[_manage_emp["Department"].astype(str).str.strip() == dept_name]
-                                    for _, emp in affected_emps.head(10).iterrows():
-                                        st.write(f"• {emp['Name']}")
+                                    affected_emps = _manage_emp.iloc[manage_dept_rows.get(dept_name, [])[:10]]
+                                    st.markdown("  \n".join(f"• {n}" for n in affected_emps["Name"]))
                                     if emp_count > 10:
                                         st.write(f"... and {emp_count - 10} more")
         
@@ -2891,32 +3326,37 @@ if st.session_state.show_dept_manage:
                     renamed_count = 0
                     merged_count = 0
                     deleted_count = 0
+                    now_iso = utc_now_iso()
+                    # Employee department rewrites are collected here and applied in one pass after the loop;
+                    # every (old, new) claim is listed too so conflicting actions are caught first
+                    rename_map = {}
+                    rename_claims = []
+                    # Likewise department edits: Dept ID -> new value per column, and the IDs to drop
+                    dept_updates = {"Department Name": {}, "Description": {}}
+                    ids_to_remove = set()
                     
                     for dept_id, action_data in st.session_state.dept_manage_actions.items():
                         action = action_data["action"]
                         
                         if action == "rename":
                             # Rename department in department list
-                            mask_dept = st.session_state.df_dept["Dept ID"] == dept_id
-                            st.session_state.df_dept.loc[mask_dept, "Department Name"] = action_data["new_name"]
+                            dept_updates["Department Name"][dept_id] = action_data["new_name"]
                             if action_data.get("new_desc"):
-                                st.session_state.df_dept.loc[mask_dept, "Description"] = action_data["new_desc"]
+                                dept_updates["Description"][dept_id] = action_data["new_desc"]
                             
                             # Update all employee records
-                            mask_emp = st.session_state.df_emp["Department"].astype(str).str.strip() == action_data["old_name"]
-                            st.session_state.df_emp.loc[mask_emp, "Department"] = action_data["new_name"]
-                            st.session_state.df_emp.loc[mask_emp, "Last Updated"] = datetime.utcnow().isoformat()
+                            rename_map[action_data["old_name"]] = action_data["new_name"]
+                            rename_claims.append((action_data["old_name"], action_data["new_name"]))
                             
                             renamed_count += 1
                         
                         elif action == "merge":
                             # Move employees to target department
-                            mask_emp = st.session_state.df_emp["Department"].astype(str).str.strip() == action_data["old_name"]
-                            st.session_state.df_emp.loc[mask_emp, "Department"] = action_data["target"]
-                            st.session_state.df_emp.loc[mask_emp, "Last Updated"] = datetime.utcnow().isoformat()
+                            rename_map[action_data["old_name"]] = action_data["target"]
+                            rename_claims.append((action_data["old_name"], action_data["target"]))
                             
                             # Delete source department
-                            st.session_state.df_dept = st.session_state.df_dept[st.session_state.df_dept["Dept ID"] != dept_id]
+                            ids_to_remove.add(dept_id)
                             
                             merged_count += 1
                         
@@ -2929,51 +3369,63 @@ if st.session_state.show_dept_manage:
                             keep_id = action_data["dept1_id"] if delete_id == action_data["dept2_id"] else action_data["dept2_id"]
                             
                             # Update the kept department's name to final name
-                            mask_dept = st.session_state.df_dept["Dept ID"] == keep_id
-                            st.session_state.df_dept.loc[mask_dept, "Department Name"] = final_name
-                            st.session_state.df_dept.loc[mask_dept, "Description"] = f"Merged from: {dept1_name}, {dept2_name}"
+                            dept_updates["Department Name"][keep_id] = final_name
+                            dept_updates["Description"][keep_id] = f"Merged from: {dept1_name}, {dept2_name}"
                             
                             # Update all employees from both departments to use final name
-                            mask_emp1 = st.session_state.df_emp["Department"].astype(str).str.strip() == dept1_name
-                            mask_emp2 = st.session_state.df_emp["Department"].astype(str).str.strip() == dept2_name
-                            combined_mask = mask_emp1 | mask_emp2
-                            st.session_state.df_emp.loc[combined_mask, "Department"] = final_name
-                            st.session_state.df_emp.loc[combined_mask, "Last Updated"] = datetime.utcnow().isoformat()
+                            rename_map[dept1_name] = rename_map[dept2_name] = final_name
+                            rename_claims += [(dept1_name, final_name), (dept2_name, final_name)]
                             
                             # Delete the other department
-                            st.session_state.df_dept = st.session_state.df_dept[st.session_state.df_dept["Dept ID"] != delete_id]
+                            ids_to_remove.add(delete_id)
                             
                             merged_count += 1
                         
                         elif action == "delete":
-                            # Delete department (only if no employees)
-                            st.session_state.df_dept = st.session_state.df_dept[st.session_state.df_dept["Dept ID"] != dept_id]
+                            # Delete department (only if no employees); claimed so no other action can move rows into it
+                            ids_to_remove.add(dept_id)
+                            rename_claims.append((action_data["old_name"], ""))
                             deleted_count += 1
                     
-                    # Save changes
-                    write_workbook(EXCEL_PATH, st.session_state.df_emp, st.session_state.df_dept, st.session_state.df_users)
+                    conflicts = department_rename_conflicts(rename_claims)
+                    if conflicts:
+                        st.error(f"⚠️ These departments are changed by more than one action: {', '.join(conflicts)}. Apply those changes in separate steps.")
+                    else:
+                        dept_ids = st.session_state.df_dept["Dept ID"]
+                        for col, new_by_id in dept_updates.items():
+                            if new_by_id:
+                                hit = dept_ids.isin(list(new_by_id))
+                                st.session_state.df_dept.loc[hit, col] = dept_ids[hit].map(new_by_id)
+                        if ids_to_remove:
+                            st.session_state.df_dept = st.session_state.df_dept.loc[~dept_ids.isin(list(ids_to_remove))].reset_index(drop=True)
+                        apply_department_renames(st.session_state.df_emp, rename_map, now_iso)
                     
-                    # Show success message
-                    success_msg = "🎉 Department management completed!\n\n"
-                    if renamed_count > 0:
-                        success_msg += f"✏️ Renamed {renamed_count} department(s)\n"
-                    if merged_count > 0:
-                        success_msg += f"🔀 Merged {merged_count} department(s)\n"
-                    if deleted_count > 0:
-                        success_msg += f"🗑️ Deleted {deleted_count} department(s)\n"
+                        # Save changes
+                        save_data()
                     
-                    st.success(success_msg)
+                        # Show success message
+                        success_msg = "🎉 Department management completed!\n\n"
+                        if renamed_count > 0:
+                            success_msg += f"✏️ Renamed {renamed_count} department(s)\n"
+                        if merged_count > 0:
+                            success_msg += f"🔀 Merged {merged_count} department(s)\n"
+                        if deleted_count > 0:
+                            success_msg += f"🗑️ Deleted {deleted_count} department(s)\n"
                     
-                    # Reset state
-                    st.session_state.show_dept_manage = False
-                    st.session_state.dept_manage_actions = {}
-                    time.sleep(2)
-                    st.rerun()
+                        # Shown as a toast after the rerun instead of blocking this one in a sleep
+                        st.session_state.flash_message = success_msg
+                    
+                        # Reset state
+                        st.session_state.show_dept_manage = False
+                        st.session_state.dept_manage_actions = {}
+                        st.session_state.pop('manage_active_dept', None)
+                        st.rerun()
         
         with col_btn2:
             if st.button("❌ Cancel", use_container_width=True, key="cancel_manage_btn"):
                 st.session_state.show_dept_manage = False
                 st.session_state.dept_manage_actions = {}
+                st.session_state.pop('manage_active_dept', None)
                 st.rerun()
         
         with col_btn3:
@@ -2995,35 +3447,48 @@ with st.expander("📊 Advanced Analytics & Reports"):
     with col_a1:
         st.markdown("**👥 Users by Department**")
         if not df_dept.empty:
-            dept_stats = []
-            for dept_name in df_dept["Department Name"].unique():
-                count = len(df_emp[df_emp['Department'] == dept_name])
-                dept_stats.append({"Department": dept_name, "Users": count})
-            st.dataframe(pd.DataFrame(dept_stats), hide_index=True, use_container_width=True)
+            # Per-department counts are kept with the employee index, so they are only recounted after a save
+            refresh_employee_index()
+            dept_names = df_dept["Department Name"].unique()
+            dept_stats = pd.DataFrame({"Department": dept_names})
+            dept_stats["Users"] = dept_stats["Department"].map(st.session_state.dept_counts).fillna(0).astype(int)
+            st.dataframe(dept_stats, hide_index=True, use_container_width=True)
     
     with col_a2:
         st.markdown("**📈 Status Distribution**")
-        status_counts = df_emp['Status'].value_counts().reset_index()
-        status_counts.columns = ['Status', 'Count']
-        st.dataframe(status_counts, hide_index=True, use_container_width=True)
+        # Reuses the counts computed for the sidebar Quick Stats
+        status_table = status_counts.rename_axis('Status').reset_index(name='Count')
+        st.dataframe(status_table, hide_index=True, use_container_width=True)
     
     with col_a3:
         st.markdown("**🔢 Extension Usage**")
         if not df_emp.empty:
-            ext_4digit = df_emp[df_emp['Extension'].str.len() == 4]
-            st.metric("4-Digit Extensions", len(ext_4digit))
-            st.metric("Total Extensions", len(df_emp[df_emp['Extension'] != '']))
+            # Summing the boolean masks counts rows without building filtered copies of the frame
+            st.metric("4-Digit Extensions", int((df_emp['Extension'].str.len() == 4).sum()))
+            st.metric("Total Extensions", int((df_emp['Extension'] != '').sum()))
 
 # Audit Log - Admin only
 if is_admin():
     with st.expander("🔍 Audit Log (Last 10 Updates)"):
         if not df_emp.empty and 'Last Updated' in df_emp.columns:
-            recent = df_emp[df_emp['Last Updated'] != ''].sort_values('Last Updated', ascending=False).head(10)
+            # Latest updates only change when the data does, so the sort is redone only after a save
+            if st.session_state.get('audit_version') != st.session_state._data_version:
+                emp_now = st.session_state.df_emp
+                dated = emp_now[emp_now['Last Updated'] != '']
+                # Top-10 selection instead of a full sort (nlargest doesn't take string columns); ties keep file order.
+                # select_k can't run on an empty table, so that case skips it
+                if len(dated):
+                    latest = pc.select_k_unstable(
+                        pa.table({"ts": pa.array(dated['Last Updated'].astype(STRING_DTYPE)), "pos": np.arange(len(dated))}),
+                        k=10, sort_keys=[("ts", "descending"), ("pos", "ascending")],
+                    )
+                    dated = dated.iloc[latest.to_numpy()]
+                st.session_state.audit_recent = dated
+                st.session_state.audit_version = st.session_state._data_version
+            recent = st.session_state.audit_recent
             if not recent.empty:
-                audit_display = recent[['Row ID', 'Name', 'Employee ID', 'Department', 'Status', 'Last Updated']].copy()
-                # Convert to display-friendly format
-                for col in audit_display.columns:
-                    audit_display[col] = audit_display[col].astype(str)
+                # Convert to display-friendly format (one astype builds the new frame, no per-column setitem)
+                audit_display = recent[['Row ID', 'Name', 'Employee ID', 'Department', 'Status', 'Last Updated']].astype(str)
                 st.dataframe(audit_display, hide_index=True, use_container_width=True)
             else:
                 st.info("No audit trail available yet")
@@ -0,0 +1,74 @@
+"""Tests for the department rename helpers used by the Sync and Manage apply handlers.
+
+Importing the app module would run the whole Streamlit script, so the two helpers are
+lifted out of its source and executed on their own.
+"""
+import ast
+from pathlib import Path
+
+import pandas as pd
+
+APP_PATH = Path(__file__).resolve().parents[1] / "streamlit_ad_portal_app.py"
+HELPERS = {"department_rename_conflicts", "apply_department_renames"}
+
+
+def load_helpers() -> dict:
+    tree = ast.parse(APP_PATH.read_text(encoding="utf-8"))
+    funcs = [node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name in HELPERS]
+    namespace = {"pd": pd}
+    exec(compile(ast.Module(body=funcs, type_ignores=[]), str(APP_PATH), "exec"), namespace)
+    return namespace
+
+
+helpers = load_helpers()
+department_rename_conflicts = helpers["department_rename_conflicts"]
+apply_department_renames = helpers["apply_department_renames"]
+
+
+def employees(*departments):
+    return pd.DataFrame({"Department": list(departments), "Last Updated": [""] * len(departments)})
+
+
+def test_map_is_applied_one_level_deep():
+    df = employees("A", "B", "X")
+    moved = apply_department_renames(df, {"X": "A", "A": "B"}, "ts")
+    assert df["Department"].tolist() == ["B", "B", "A"]
+    assert df["Last Updated"].tolist() == ["ts", "", "ts"]
+    assert moved.to_dict() == {"A": 1, "X": 1}
+
+
+def test_swap_is_applied_one_level_deep():
+    df = employees("A", "B")
+    apply_department_renames(df, {"A": "B", "B": "A"}, "ts")
+    assert df["Department"].tolist() == ["B", "A"]
+
+
+def test_chain_is_a_conflict():
+    assert department_rename_conflicts([("X", "A"), ("A", "B")]) == ["A"]
+
+
+def test_cycle_is_a_conflict():
+    assert department_rename_conflicts([("A", "B"), ("B", "A")]) == ["A", "B"]
+    assert department_rename_conflicts([("A", "B"), ("B", "C"), ("C", "A")]) == ["A", "B", "C"]
+
+
+def test_chained_merges_are_a_conflict():
+    # Merge HR+Sales keeping Sales, then Sales+IT keeping IT: Sales is claimed by both merges
+    claims = [("HR", "Sales"), ("Sales", "Sales"), ("Sales", "IT"), ("IT", "IT")]
+    assert department_rename_conflicts(claims) == ["Sales"]
+
+
+def test_department_claimed_twice_is_a_conflict():
+    assert department_rename_conflicts([("A", "B"), ("A", "C")]) == ["A"]
+    assert department_rename_conflicts([("A", "A"), ("A", "")]) == ["A"]
+
+
+def test_merge_into_deleted_department_is_a_conflict():
+    assert department_rename_conflicts([("X", "D"), ("D", "")]) == ["D"]
+
+
+def test_merges_and_removals_are_not_conflicts():
+    # A merge that keeps one side's name maps that side to itself; removals map to ""
+    assert department_rename_conflicts([("A", "A"), ("B", "A"), ("C", ""), ("D", "E")]) == []
+    # The same claim made twice (both sides of a merge pair listing it) agrees with itself
+    assert department_rename_conflicts([("A", "C"), ("B", "C"), ("A", "C")]) == []